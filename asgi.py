@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+ASGI 版 (uvicorn など)
+──────────────────────────────────────────
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+▪ /api/stream (SSE) はイベントループ上で直接流す。接続がいくつあってもスレッドを占有しない
+▪ それ以外のルートは Flask アプリをスレッドプールで実行する (応答は短いので本文はまとめて返す)
+▪ 上流の取得結果は gunicorn 版と同じく /dev/shm 上でワーカー間共有 (取得するのは 1 ワーカーだけ)
+──────────────────────────────────────────
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+import asyncio
+import io
+import json
+import os
+import sys
+
+os.environ.setdefault("TIMETABLE_SHARED_DIR", "/dev/shm/timetable-app")
+
+import timetable_app as ta   # noqa: E402
+
+POLL = 0.5   # 新しいイベントを確認する間隔 (秒)
+WSGI_THREADS = int(os.environ.get("THREADS", "16"))
+
+ta.prepare()
+ta.WATCHER.start()
+_pool = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+def _environ(scope, body: bytes) -> dict:
+    """ASGI の scope ➜ WSGI の environ (PEP 3333)"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    env = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for k, v in scope["headers"]:
+        name, value = k.decode("latin-1").upper().replace("-", "_"), v.decode("latin-1")
+        if name == "CONTENT_TYPE" or name == "CONTENT_LENGTH":
+            env[name] = value
+        else:
+            key = f"HTTP_{name}"
+            env[key] = f"{env[key]},{value}" if key in env else value
+    return env
+
+
+def _call_wsgi(env: dict) -> tuple[int, list, bytes]:
+    started: list = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]), headers]
+
+    it = ta.app.wsgi_app(env, start_response)
+    try:
+        body = b"".join(it)
+    finally:
+        if hasattr(it, "close"):
+            it.close()
+    return started[0], started[1], body
+
+
+async def flask(scope, receive, send) -> None:
+    body = b""
+    while True:
+        msg = await receive()
+        body += msg.get("body", b"")
+        if not msg.get("more_body"):
+            break
+    status, headers, out = await asyncio.get_running_loop().run_in_executor(_pool, _call_wsgi, _environ(scope, body))
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+    await send({"type": "http.response.body", "body": out})
+
+
+async def _send_json(send, status: int, payload: dict) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _disconnected(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def stream(scope, receive, send) -> None:
+    """/api/stream の非同期版 (EventHub の配信内容・絞り込みは WSGI 版と同じ)"""
+    qs = {k: v[0] for k, v in parse_qs(scope["query_string"].decode("latin-1")).items()}
+    try:
+        page = int(qs["page"]) if "page" in qs else None
+        if qs.get("schedule") == "0":
+            sc = ()
+        else:
+            sc = ta.resolve_scope(qs.get("routes"), qs.get("board"), page, qs.get("site"))
+    except ValueError as e:
+        await _send_json(send, 400, {"error": str(e)})
+        return
+
+    seq, sel, first = ta.EVENTS.open(sc)
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ]})
+    await send({"type": "http.response.body", "body": b"".join(first), "more_body": True})
+
+    gone = asyncio.ensure_future(_disconnected(receive))
+    idle = 0.0
+    try:
+        while not gone.done():
+            await asyncio.sleep(POLL)
+            seq, new = ta.EVENTS.since(seq, sel)
+            if new:
+                idle = 0.0
+                await send({"type": "http.response.body", "body": b"".join(new), "more_body": True})
+            elif (idle := idle + POLL) >= ta.EVENTS.keepalive:
+                idle = 0.0
+                await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+    finally:
+        gone.cancel()
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        msg = await receive()
+        if msg["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif msg["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+    elif scope["type"] == "http" and scope["path"] == "/api/stream":
+        await stream(scope, receive, send)
+    else:
+        await flask(scope, receive, send)
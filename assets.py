@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+静的ファイルのビルド (内容ハッシュ入りの名前 + 圧縮済みの版)
+──────────────────────────────────────────
+    python assets.py        # static/ ➜ static/dist/ (起動時の prepare() でも同じ処理を行う)
+
+▪ static/*.js・*.css と static/img/ を、内容のハッシュ入りの名前 (app.1a2b3c4d5e.js) で static/dist/ に書き出す
+▪ テキストは .gz (brotli モジュールがあれば .br も) を作っておき、配信時は圧縮済みのバイト列をそのまま返す
+▪ PNG は表示に関係しない補助チャンクを落とし、画素データを最大圧縮で詰め直す (小さくなった時だけ採用)
+▪ static/dist/manifest.json : 元の名前 ➜ ハッシュ入りの名前と圧縮版の一覧。内容が同じファイルは作り直さない
+──────────────────────────────────────────
+"""
+
+from __future__ import annotations
+from pathlib import Path
+import gzip
+import hashlib
+import json
+import os
+import struct
+import sys
+import zlib
+try:
+    import brotli   # .br を作る (無ければ gzip だけ)
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {".js", ".css", ".svg", ".json", ".html", ".txt"}
+IMAGES = {".png", ".svg", ".gif", ".jpg", ".jpeg", ".webp", ".ico"}
+
+_PNG_SIG = b"\x89PNG\r\n\x1a\n"
+# 画の見た目に関わるチャンク (これ以外の tEXt・tIME・pHYs などは落とす)
+_PNG_KEEP = {b"IHDR", b"PLTE", b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"iCCP", b"sBIT", b"IEND"}
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def optimize_png(data: bytes) -> bytes:
+    """PNG を可逆のまま小さくする (IDAT を 1 つにまとめて zlib 最大圧縮)。壊れていれば元のまま返す"""
+    if not data.startswith(_PNG_SIG):
+        return data
+    head, idat, tail = [], [], []
+    i = len(_PNG_SIG)
+    try:
+        while i < len(data):
+            n, kind = struct.unpack_from(">I4s", data, i)
+            body = data[i + 8:i + 8 + n]
+            i += 12 + n
+            if kind == b"IDAT":
+                idat.append(body)
+            elif kind in _PNG_KEEP:
+                (tail if idat else head).append(_chunk(kind, body))
+        pixels = zlib.decompress(b"".join(idat))
+    except (struct.error, zlib.error):
+        return data
+    out = _PNG_SIG + b"".join(head) + _chunk(b"IDAT", zlib.compress(pixels, 9)) + b"".join(tail)
+    return out if len(out) < len(data) else data
+
+
+def sources(static_dir: Path) -> list[Path]:
+    """ビルド対象 (直下の JS・CSS と img/ の画像)。dist/・logos/ は対象外"""
+    top = [p for p in static_dir.glob("*") if p.is_file() and p.suffix in (".js", ".css")]
+    img = [p for p in (static_dir / "img").glob("*") if p.is_file() and p.suffix.lower() in IMAGES]
+    return sorted(top + img)
+
+
+def _write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def build(static_dir: Path, out_dir: Path | None = None) -> dict:
+    """
+    static_dir のファイルを out_dir (既定 static_dir/dist) に書き出し、manifest を返す。
+      {"files": {"app.js": "app.1a2b3c4d5e.js", "img/OM.png": "img/OM.0f1e2d3c4b.png", ...},
+       "encodings": {"app.1a2b3c4d5e.js": ["br", "gzip"], ...}}
+    同じ内容の出力が既にあれば書き直さない。manifest に無くなった古い版は消す。
+    """
+    out_dir = out_dir or static_dir / "dist"
+    files: dict[str, str] = {}
+    encodings: dict[str, list[str]] = {}
+    keep = {"manifest.json"}
+    for src in sources(static_dir):
+        name = src.relative_to(static_dir).as_posix()
+        raw = src.read_bytes()
+        digest = hashlib.blake2b(raw, digest_size=5).hexdigest()
+        hashed = f"{name[:-len(src.suffix)]}.{digest}{src.suffix}"
+        files[name] = hashed
+        dest = out_dir / hashed
+        variants = {}
+        if src.suffix in COMPRESSIBLE:
+            variants["gzip"] = dest.with_name(dest.name + ".gz")
+            if brotli is not None:
+                variants["br"] = dest.with_name(dest.name + ".br")
+        if not dest.exists() or any(not p.exists() for p in variants.values()):
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            data = optimize_png(raw) if src.suffix.lower() == ".png" else raw
+            _write(dest, data)
+            if "gzip" in variants:
+                _write(variants["gzip"], gzip.compress(data, 9, mtime=0))
+            if "br" in variants:
+                _write(variants["br"], brotli.compress(data, quality=11))
+        if variants:
+            encodings[hashed] = sorted(variants)   # "br" が先 (優先して返す)
+        keep.update(p.relative_to(out_dir).as_posix() for p in (dest, *variants.values()))
+
+    manifest = {"files": files, "encodings": encodings}
+    _write(out_dir / "manifest.json", json.dumps(manifest, ensure_ascii=False, indent=1).encode("utf-8"))
+    for p in out_dir.rglob("*"):
+        if p.is_file() and p.suffix != ".tmp" and p.relative_to(out_dir).as_posix() not in keep:
+            p.unlink(missing_ok=True)
+    return manifest
+
+
+if __name__ == "__main__":
+    root = Path(__file__).resolve().parent / "static"
+    result = build(root)
+    total = sum((root / n).stat().st_size for n in result["files"])
+    built = sum((root / "dist" / h).stat().st_size for h in result["files"].values())
+    for name, hashed in result["files"].items():
+        print(f"{name:45s} ➜ dist/{hashed}  {','.join(result['encodings'].get(hashed, []))}")
+    print(f"{len(result['files'])} files, {total} ➜ {built} bytes (圧縮版を除く)", file=sys.stderr)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+ディレクトリ監視
+──────────────────────────────────────────
+▪ Linux  : inotify (ctypes で libc を直接呼ぶので追加の依存はない)
+▪ その他 : ファイルの mtime・サイズを interval 秒ごとに比べる
+DirWatcher(dir).wait(timeout) ➜ 追加・更新・削除・リネームされたファイル名の集合
+inotify では書き込み途中のファイルを拾わないよう、書き込み完了 (CLOSE_WRITE) と移動・削除だけを見る。
+カーネルのイベントキューが溢れた (IN_Q_OVERFLOW) 時は取りこぼしがあるので、ディレクトリを走査し直して
+前回の走査で見えていた名前と今ある名前を全部返す (差し替え側が mtime を見て変わっていないものは読み飛ばす)。
+──────────────────────────────────────────
+"""
+
+from __future__ import annotations
+from pathlib import Path
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_DELETE      = 0x00000200
+IN_Q_OVERFLOW  = 0x00004000   # wd = -1・名前なしで届く (watch の指定に関係なく)
+IN_NONBLOCK    = 0o0004000
+IN_CLOEXEC     = 0o2000000
+_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+_EVENT = struct.Struct("iIII")   # wd, mask, cookie, len (+ 名前 len バイト)
+
+
+def _scan(directory: Path) -> dict[str, tuple[int, int]]:
+    """ファイル名 ➜ (mtime_ns, サイズ)"""
+    out = {}
+    for p in directory.iterdir():
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        out[p.name] = (st.st_mtime_ns, st.st_size)
+    return out
+
+
+class _Inotify:
+    def __init__(self, directory: Path) -> None:
+        self.dir = directory
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), _MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed: {directory}")
+        self.overflows = 0
+        self._seen = set(_scan(directory))   # 今ある (はずの) 名前。溢れた時に消えたファイルも返せるよう覚えておく
+
+    def wait(self, timeout: float) -> set[str]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        names: set[str] = set()
+        overflow = False
+        while ready:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            i = 0
+            while i < len(buf):
+                _, mask, _, n = _EVENT.unpack_from(buf, i)
+                i += _EVENT.size
+                name = os.fsdecode(buf[i:i + n].rstrip(b"\0"))
+                i += n
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif name:
+                    names.add(name)
+                    if mask & (IN_DELETE | IN_MOVED_FROM):
+                        self._seen.discard(name)
+                    else:
+                        self._seen.add(name)
+        if overflow:
+            self.overflows += 1
+            now = set(_scan(self.dir))
+            names |= now | self._seen
+            self._seen = now
+        return names
+
+
+class _Poller:
+    def __init__(self, directory: Path, interval: float) -> None:
+        self.dir = directory
+        self.interval = interval
+        self._state = _scan(directory)
+
+    def wait(self, timeout: float) -> set[str]:
+        time.sleep(min(timeout, self.interval))
+        new, old = _scan(self.dir), self._state
+        self._state = new
+        return {n for n in new.keys() | old.keys() if new.get(n) != old.get(n)}
+
+
+class DirWatcher:
+    """kind は "inotify" か "poll" (inotify が使えない環境)"""
+
+    def __init__(self, directory: Path, interval: float = 2.0) -> None:
+        try:
+            self._impl: _Inotify | _Poller = _Inotify(directory)
+            self.kind = "inotify"
+        except (OSError, AttributeError, TypeError):
+            self._impl = _Poller(directory, interval)
+            self.kind = "poll"
+
+    def wait(self, timeout: float) -> set[str]:
+        """timeout 秒まで待ち、その間に変化したファイル名を返す (無ければ空集合)"""
+        return self._impl.wait(timeout)
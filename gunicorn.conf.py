@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+本番用 gunicorn 設定 (Linux)
+──────────────────────────────────────────
+    gunicorn -c gunicorn.conf.py timetable_app:app
+
+通常の本番起動は asgi.py (uvicorn) を使う。こちらは uvicorn を入れられない環境用。
+▪ マルチワーカー + スレッド (gthread)。SSE (/api/stream) の接続はスレッドを 1 本ずつ使うので、
+  1 ワーカーで開いておく接続は threads の半分まで (TIMETABLE_MAX_STREAMS)。超えた接続は 503 で断り、
+  画面はポーリングに切り替える (通常の /api/* に回すスレッドが尽きないように)
+▪ preload_app : 親プロセスで時刻表を読み込んでから fork する (ワーカー間でメモリを共有)
+▪ 上流 (天気・ニュース・運行情報) の取得結果は /dev/shm 上で共有し、取得するのは 1 ワーカーだけ
+▪ timetable_data/ の変更は各ワーカーの監視スレッドが拾う (再起動不要)。パースしてスナップショットを書き直すのは
+  リーダーのワーカーだけで、他のワーカーは書き直されたスナップショットを mmap し直す
+環境変数で上書きできる: BIND, WEB_CONCURRENCY, THREADS, TIMETABLE_SHARED_DIR, TIMETABLE_MAX_STREAMS
+──────────────────────────────────────────
+"""
+
+import multiprocessing
+import os
+
+# timetable_app を import する前に設定する (preload_app なのでこの後すぐ import される)
+os.environ.setdefault("TIMETABLE_SHARED_DIR", "/dev/shm/timetable-app")
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", min(4, multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.environ.get("THREADS", "32"))
+os.environ.setdefault("TIMETABLE_MAX_STREAMS", str(max(1, threads // 2)))
+keepalive = 5
+preload_app = True
+accesslog = None
+
+
+def on_starting(server):
+    from timetable_app import prepare
+    prepare()
+
+
+def post_fork(server, worker):
+    # スレッドは fork で引き継がれないので、時刻表の監視はワーカーごとに始める
+    # (リーダーのロックは監視スレッドの中で取る。親プロセスで取ると全ワーカーに引き継がれてしまう)
+    from timetable_app import WATCHER
+    WATCHER.start()
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+共有 HTTP クライアント
+──────────────────────────────────────────
+▪ ホストごとのコネクションプール (keep-alive)
+▪ ETag / Last-Modified による条件付き GET (変化なしなら 304 で本文を再利用)
+▪ ホストごとのサーキットブレーカー (連続失敗で一定時間そのホストへ送らず、キャッシュを返す)
+▪ metrics を渡すと、ホストごとの所要時間と結果 (ok / not_modified / error / timeout / circuit_open) を記録
+──────────────────────────────────────────
+URL はそのまま渡すだけなので、ローカルのスタブサーバー (http://127.0.0.1:xxxx/...) に
+向ければオフラインでも動作・計測できる。
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, NamedTuple
+from urllib.parse import urlsplit
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = "timetable-app/1.0 (+departure board)"
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """サーキットが開いていて、かつキャッシュもない時に送出"""
+
+
+class HttpResult(NamedTuple):
+    status: int
+    content: bytes
+    headers: dict[str, str]
+    not_modified: bool = False   # 304 を受けてキャッシュ本文を返した
+    stale: bool = False          # 上流エラー / サーキット open のためキャッシュ本文を返した
+
+    def text(self, encoding: str = "utf-8") -> str:
+        return self.content.decode(encoding, errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class CircuitBreaker:
+    """
+    closed ➜ (連続 fail_threshold 回失敗) ➜ open ➜ (reset_after 秒経過) ➜ half-open
+    half-open では 1 リクエストだけ試し、成功すれば closed、失敗すれば再び open。
+    """
+
+    def __init__(self, fail_threshold: int = 3, reset_after: float = 60.0) -> None:
+        self.fail_threshold = fail_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            st = self.state
+            if st == "closed":
+                return True
+            if st == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.fail_threshold:
+                self.opened_at = time.monotonic()
+
+
+class _Entry(NamedTuple):
+    result: HttpResult
+    etag: str | None
+    last_modified: str | None
+    parsed: dict
+
+
+class HttpClient:
+    """
+    requests.Session を共有し、URL ごとに最後の 200 応答と検証子 (ETag / Last-Modified) を覚えておく。
+      get(url)                : HttpResult を返す
+      get_json(url)           : JSON をデコードして返す (304 の時はデコード済みの値を再利用)
+      get_parsed(url, parser) : 任意のパーサ (例: feedparser.parse) の結果を同様に再利用
+    """
+
+    def __init__(self, timeout: float = 6.0, pool_connections: int = 16, pool_maxsize: int = 16,
+                 fail_threshold: int = 3, reset_after: float = 60.0, metrics: Any = None) -> None:
+        self.timeout = timeout
+        self.metrics = metrics   # inc() / observe() を持つもの (metrics.Metrics)
+        self.fail_threshold = fail_threshold
+        self.reset_after = reset_after
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache: dict[str, _Entry] = {}
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).netloc
+        br = self._breakers.get(host)
+        if br is None:
+            with self._lock:
+                br = self._breakers.setdefault(host, CircuitBreaker(self.fail_threshold, self.reset_after))
+        return br
+
+    def _fallback(self, url: str, err: Exception) -> HttpResult:
+        ent = self._cache.get(url)
+        if ent is None:
+            raise err
+        return ent.result._replace(stale=True)
+
+    def _count(self, host: str, result: str) -> None:
+        if self.metrics is not None:
+            self.metrics.inc("upstream_requests_total", host=host, result=result)
+
+    def get(self, url: str, timeout: float | None = None) -> HttpResult:
+        br = self.breaker(url)
+        host = urlsplit(url).netloc
+        if not br.allow():
+            self._count(host, "circuit_open")
+            return self._fallback(url, CircuitOpenError(f"circuit open: {host}"))
+
+        ent = self._cache.get(url)
+        headers: dict[str, str] = {}
+        if ent is not None:
+            if ent.etag:
+                headers["If-None-Match"] = ent.etag
+            if ent.last_modified:
+                headers["If-Modified-Since"] = ent.last_modified
+
+        t0 = time.perf_counter()
+        try:
+            r = self.session.get(url, headers=headers, timeout=timeout or self.timeout)
+            if r.status_code >= 500:
+                r.raise_for_status()
+        except requests.RequestException as e:
+            br.failure()
+            self._count(host, "timeout" if isinstance(e, requests.Timeout) else "error")
+            return self._fallback(url, e)
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe("upstream_request_seconds", time.perf_counter() - t0, host=host)
+        br.success()
+
+        if r.status_code == 304 and ent is not None:
+            self._count(host, "not_modified")
+            return ent.result._replace(not_modified=True, stale=False)
+        self._count(host, "ok" if r.ok else "error")
+        r.raise_for_status()
+
+        res = HttpResult(r.status_code, r.content, dict(r.headers))
+        # 検証子がなくても、障害時のフォールバック用に最後の本文は覚えておく
+        self._cache[url] = _Entry(res, r.headers.get("ETag"), r.headers.get("Last-Modified"), {})
+        return res
+
+    def get_parsed(self, url: str, parser: Callable[[HttpResult], Any], timeout: float | None = None) -> Any:
+        res = self.get(url, timeout)
+        ent = self._cache.get(url)
+        if ent is None or ent.result.content is not res.content:
+            return parser(res)
+        key = getattr(parser, "__qualname__", repr(parser))
+        if key not in ent.parsed:
+            ent.parsed[key] = parser(res)
+        return ent.parsed[key]
+
+    def get_json(self, url: str, timeout: float | None = None) -> Any:
+        return self.get_parsed(url, HttpResult.json, timeout)
+
+    def stats(self) -> dict[str, str]:
+        """ホスト ➜ サーキット状態"""
+        return {host: br.state for host, br in self._breakers.items()}
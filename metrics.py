@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+計測とログ
+──────────────────────────────────────────
+▪ Metrics : カウンタ・所要時間ヒストグラム・ゲージを集計し、Prometheus のテキスト形式で出力
+▪ 区間計測 : with METRICS.timer("name", label=...) で所要時間を記録。
+            リクエスト単位のプロファイルが有効な間は、その区間の内訳も集める (Server-Timing 用)
+▪ Log     : レベル付き・同じキーは一定間隔に 1 回だけ出すログ (毎リクエスト出る警告で標準出力を埋めない)
+──────────────────────────────────────────
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Callable, Iterator
+import os
+import sys
+import threading
+import time
+
+# 所要時間ヒストグラムの上限 (秒)。CSV 1 本 (ミリ秒) 〜 上流 API のタイムアウト (数秒) を覆う
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+# 現在のリクエストで集めている区間の内訳 [(区間名, 秒), ...]。プロファイル無効時は None
+_trace: ContextVar[list[tuple[str, float]] | None] = ContextVar("metrics_trace", default=None)
+
+
+def _labels(labels: dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels, le: str | None = None) -> str:
+    """ラベル ➜ {k="v",...} (値の \\ と " はエスケープ)"""
+    pairs = list(labels) + ([("le", le)] if le is not None else [])
+    if not pairs:
+        return ""
+    esc = [(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in esc) + "}"
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        for i, b in enumerate(BUCKETS):
+            if v <= b:
+                self.counts[i] += 1
+                break
+        self.total += v
+        self.count += 1
+
+
+class Metrics:
+    """
+    inc(name, **labels)              : カウンタを増やす
+    observe(name, seconds, **labels) : 所要時間をヒストグラムに足す
+    timer(name, **labels)            : with 区間の所要時間を observe する (例外時も記録)
+    gauge(name, fn, help)            : 出力時に fn() ➜ {ラベル dict の tuple: 値} を読むゲージ
+    render()                         : Prometheus テキスト形式
+    """
+
+    def __init__(self, prefix: str = "") -> None:
+        self.prefix = prefix
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._hists: dict[str, dict[Labels, _Histogram]] = {}
+        self._gauges: dict[str, Callable[[], dict[Labels, float]]] = {}
+        self._help: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help: str) -> None:
+        self._help[name] = help
+
+    def inc(self, name: str, value: float = 1, **labels: object) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: object) -> None:
+        key = _labels(labels)
+        with self._lock:
+            h = self._hists.setdefault(name, {}).get(key)
+            if h is None:
+                h = self._hists[name][key] = _Histogram()
+            h.observe(seconds)
+        tr = _trace.get()
+        if tr is not None:
+            tag = ".".join([name.removesuffix("_seconds"), *(v for _, v in key)])
+            tr.append((tag, seconds))
+
+    @contextmanager
+    def timer(self, name: str, **labels: object) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def gauge(self, name: str, fn: Callable[[], dict[Labels, float]], help: str = "") -> None:
+        self._gauges[name] = fn
+        if help:
+            self._help[name] = help
+
+    def value(self, name: str, **labels: object) -> float:
+        """カウンタの現在値 (確認用)"""
+        return self._counters.get(name, {}).get(_labels(labels), 0)
+
+    def render(self) -> str:
+        out: list[str] = []
+
+        def head(name: str, kind: str) -> str:
+            full = self.prefix + name
+            if name in self._help:
+                out.append(f"# HELP {full} {self._help[name]}")
+            out.append(f"# TYPE {full} {kind}")
+            return full
+
+        with self._lock:
+            counters = {n: dict(s) for n, s in self._counters.items()}
+            hists = {n: {k: (list(h.counts), h.total, h.count) for k, h in s.items()}
+                     for n, s in self._hists.items()}
+        for name, series in sorted(counters.items()):
+            full = head(name, "counter")
+            out += [f"{full}{_fmt_labels(k)} {v:g}" for k, v in sorted(series.items())]
+        for name, series in sorted(hists.items()):
+            full = head(name, "histogram")
+            for k, (counts, total, count) in sorted(series.items()):
+                acc = 0
+                for b, c in zip(BUCKETS, counts):
+                    acc += c
+                    out.append(f"{full}_bucket{_fmt_labels(k, f'{b:g}')} {acc}")
+                out.append(f"{full}_bucket{_fmt_labels(k, '+Inf')} {count}")
+                out.append(f"{full}_sum{_fmt_labels(k)} {total:.6f}")
+                out.append(f"{full}_count{_fmt_labels(k)} {count}")
+        for name, fn in sorted(self._gauges.items()):
+            try:
+                series = fn()
+            except Exception as e:
+                LOG.warn(f"gauge {name} error: {e}", key=f"gauge:{name}")
+                continue
+            full = head(name, "gauge")
+            out += [f"{full}{_fmt_labels(k)} {v:g}" for k, v in sorted(series.items())]
+        return "\n".join(out) + "\n"
+
+
+def start_trace() -> Token:
+    """以降このコンテキスト (リクエスト) で計測された区間の内訳を集め始める"""
+    return _trace.set([])
+
+
+def end_trace(token: Token) -> list[tuple[str, float]]:
+    """集めた内訳 [(区間名, 秒), ...] を返して収集をやめる"""
+    tr = _trace.get() or []
+    _trace.reset(token)
+    return tr
+
+
+def server_timing(trace: list[tuple[str, float]], total: float) -> str:
+    """区間の内訳 ➜ Server-Timing ヘッダ (同じ区間名は合算、ミリ秒)"""
+    agg: dict[str, float] = {}
+    for tag, sec in trace:
+        agg[tag] = agg.get(tag, 0.0) + sec
+    items = [f'{"".join(c if c.isalnum() or c in "._-" else "_" for c in tag)};dur={sec * 1000:.2f}'
+             for tag, sec in agg.items()]
+    items.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(items)
+
+
+# ──────────────────────────────────────────
+#  ログ
+# ──────────────────────────────────────────
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+
+
+class Log:
+    """
+    print と同じ "[LEVEL] メッセージ" 形式で標準出力に出す。
+      ・level (環境変数 LOG_LEVEL、既定 INFO) 未満は出さない
+      ・同じ key (省略時はメッセージ) は interval 秒に 1 回だけ。抑えた件数は次に出す時に添える
+      ・覚えておく key は max_keys 個まで (メッセージにファイル名やエラー文が入っても増え続けない)。
+        超えたら最後に出したのが古い key から忘れる
+    """
+
+    def __init__(self, level: str | None = None, interval: float = 60.0, max_keys: int = 1024) -> None:
+        self.level = LEVELS.get((level or os.environ.get("LOG_LEVEL", "INFO")).upper(), 20)
+        self.interval = interval
+        self.max_keys = max_keys
+        self._last: dict[str, float] = {}   # key ➜ 最後に出した時刻 (出した順に並ぶ)
+        self._dropped: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def enabled(self, level: str) -> bool:
+        """level のログが出るか (メッセージを組み立てる前に確かめる用)"""
+        return LEVELS[level] >= self.level
+
+    def log(self, level: str, msg: str, key: str | None = None) -> None:
+        if LEVELS[level] < self.level:
+            return
+        key = key or msg
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._dropped[key] = self._dropped.get(key, 0) + 1
+                return
+            self._last.pop(key, None)
+            self._last[key] = now
+            dropped = self._dropped.pop(key, 0)
+            while len(self._last) > self.max_keys:
+                old = next(iter(self._last))
+                del self._last[old]
+                self._dropped.pop(old, None)
+        suffix = f" (直近 {dropped} 件を省略)" if dropped else ""
+        sys.stdout.write(f"[{level}] {msg}{suffix}\n")   # 1 回の write で出す (スレッド間で行が混ざらない)
+        sys.stdout.flush()
+
+    def debug(self, msg: str, key: str | None = None) -> None:
+        self.log("DEBUG", msg, key)
+
+    def info(self, msg: str, key: str | None = None) -> None:
+        self.log("INFO", msg, key)
+
+    def warn(self, msg: str, key: str | None = None) -> None:
+        self.log("WARN", msg, key)
+
+    def error(self, msg: str, key: str | None = None) -> None:
+        self.log("ERROR", msg, key)
+
+
+METRICS = Metrics(prefix="timetable_")
+LOG = Log()
@@ -49,10 +49,19 @@ document.addEventListener("DOMContentLoaded", () => {
     const timers = new Set();          // すべての setInterval ID
     let statusArr = [], statusIdx = 0; // 運行情報
     let newsArr   = [], newsIdx   = -1;// ニュース
-    let scheduleJson = {};            // /api/schedule 結果
+    let scheduleJson = {};            // /api/schedule 結果 (端末で数える時はその計算結果)
     let routesInit   = false;         // routeBox 生成済み?
     let showRoutes   = [];            // 表示路線
     let countMap     = {};            // { 路線 : 表示本数 }
+
+    /* 表示対象 (サイト / ページ番号 / ?board= / ?routes=) ➜ 発車案内 API に渡すクエリ */
+    const SCOPE_QS = (()=>{
+      const q=new URLSearchParams({page:document.body.dataset.page||"1"});
+      if(document.body.dataset.site) q.set("site",document.body.dataset.site);
+      const u=new URLSearchParams(location.search);
+      ["site","board","routes"].forEach(k=>{ if(u.get(k)) q.set(k,u.get(k)); });
+      return q.toString();
+    })();
   
     /* ─────────── ローカル画像マッピング ─────────── */
     const ICON_MAP = {
@@ -106,7 +115,9 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   
     /* ─────────── 汎用 ─────────── */
-    const imgTag = fn => `<img class="logo" src="/static/img/${fn}" alt="">`;
+    /* img/ の画像はサーバーが渡すハッシュ入り URL (長期キャッシュ) を使う。無ければ元の場所 */
+    const imgUrl = fn => (window.ASSET_IMAGES || {})[fn] || `/static/img/${fn}`;
+    const imgTag = fn => `<img class="logo" src="${imgUrl(fn)}" alt="">`;
     const getIcons = label => {
       for(const key in ICON_MAP){
         if(label.includes(key)) return ICON_MAP[key];
@@ -134,20 +145,22 @@ document.addEventListener("DOMContentLoaded", () => {
       }else{
         /* 2) ローカル ICON_MAP 補完 */
         getIcons(it.text).forEach(fn=>{
-          li.insertAdjacentHTML("beforeend", `<img class="status-logo" src="/static/img/${fn}">`);
+          li.insertAdjacentHTML("beforeend", `<img class="status-logo" src="${imgUrl(fn)}">`);
         });
       }
       li.appendChild(document.createTextNode(it.text));
       ul.appendChild(li);
     }
   
+    function applyStatus(d){
+      statusArr = d.status.length ? d.status
+                                  : [{logo:null,text:"各社平常運転です"}];
+      statusIdx = 0; drawStatus();
+    }
+
     function loadStatus(){
       jFetch("/api/status")
-        .then(d => {
-          statusArr = d.status.length ? d.status
-                                      : [{logo:null,text:"各社平常運転です"}];
-          statusIdx = 0; drawStatus();
-        })
+        .then(applyStatus)
         .catch(()=>{
           statusArr = [{logo:null,text:"運行情報取得エラー"}];
           statusIdx = 0; drawStatus();
@@ -156,6 +169,7 @@ document.addEventListener("DOMContentLoaded", () => {
   
     /* ============================ 天気 ============================ */
     function drawWeather(d){
+      if(!d.forecasts) return;
       const cont = $("weather-info"); cont.innerHTML = "";
       d.forecasts.slice(0,3).forEach(f=>{
         const div = document.createElement("div"); div.className="forecast-day";
@@ -183,14 +197,18 @@ document.addEventListener("DOMContentLoaded", () => {
         el.style.opacity="1";
       },200);
     }
-    function loadNews(){
-      jFetch("/api/news").then(d=>{
-        newsArr = d.news||[];
-        if(newsIdx<0&&newsArr.length){
-          newsIdx=0; $("news-headline").textContent=newsArr[0];
-        }
-      });
+    /* d.reset なら全件、そうでなければ新着だけ (先頭に足して window 件に切り詰める) */
+    let newsCursor = "";
+    function applyNews(d){
+      const fresh = d.news||[];
+      newsArr = d.reset ? fresh : fresh.concat(newsArr).slice(0, d.window||fresh.length+newsArr.length);
+      newsCursor = d.cursor||"";
+      if(newsIdx>=newsArr.length) newsIdx=-1;
+      if(newsIdx<0&&newsArr.length){
+        newsIdx=0; $("news-headline").textContent=newsArr[0];
+      }
     }
+    const loadNews = () => jFetch("/api/news?since="+encodeURIComponent(newsCursor)).then(applyNews);
   
     /* ============================ 発車案内 ============================ */
     function buildRouteSelectors(){
@@ -267,10 +285,107 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   
     function loadSchedule(){
-      jFetch("/api/schedule").then(js=>{
+      jFetch("/api/schedule?"+SCOPE_QS).then(js=>{
         scheduleJson=js; renderSchedule(js);
       });
     }
+
+    /* ==================== 発車案内 (1 日分を受け取り端末で数える) ====================
+       /api/schedule/day を営業日ごと (と時刻表の更新時) に 1 回だけ取り、残り分は毎秒ここで計算する。
+       規則はサーバーの Timetable.next_departures / _build_schedule と同じ。取れなければ従来の取得に戻る */
+    let dayData = null, dayBucket = -1, clockSkew = 0;
+    let localSchedule = true;
+    const pad2 = n => String(n).padStart(2,"0");
+
+    function loadDay(){
+      return fetch("/api/schedule/day?"+SCOPE_QS, {cache:"no-cache"}).then(r=>{
+        if(!r.ok) throw new Error(r.status);
+        const d=r.headers.get("Date"); if(d) clockSkew=new Date(d)-Date.now();
+        return r.json();
+      }).then(js=>{
+        js.routes.forEach(r=>r.directions.forEach(d=>{ let m=0; d.minutes=d.t.map(x=>m+=x); }));
+        dayData=js; dayBucket=-1; tickSchedule();
+      }).catch(()=>{
+        if(dayData) return;   // 再検証に失敗しただけなら手元の分で続ける
+        localSchedule=false; loadSchedule();
+        if(stream){ stopStream(); startStream(); }
+      });
+    }
+
+    function nextDepartures(mins, nowSec, run, limit, horizon, cutoff){
+      const lo=Math.ceil(nowSec/60)+run, hi=Math.ceil((nowSec+horizon*60)/60), out=[];
+      for(const shift of [0,1440]){
+        let i=0; while(i<mins.length&&mins[i]<lo-shift) i++;
+        for(; i<mins.length&&out.length<limit&&mins[i]<hi-shift; i++)
+          out.push([i, Math.floor(((mins[i]+shift)*60-nowSec)/60)]);
+        if(out.length>=limit||hi-shift<=1440+cutoff*60) break;
+      }
+      return out;
+    }
+
+    function tickSchedule(){
+      if(!dayData) return;
+      const now=new Date(Date.now()+clockSkew);
+      if(now>=new Date(dayData.expires)){ dayData=null; loadDay(); return; }
+      let h=now.getHours(); if(h<dayData.cutoff) h+=24;
+      const sec=(h*60+now.getMinutes())*60+now.getSeconds();
+      if(Math.ceil(sec/60)===dayBucket) return;   // 残り分は分単位でしか変わらない
+      dayBucket=Math.ceil(sec/60);
+      const labs=["先発","次発","次々発"], skip=x=>!x||x==="-"||x==="ー";
+      scheduleJson={routes:dayData.routes.map(r=>({id:r.id, label:r.label, schedules:Object.fromEntries(
+        r.directions.map(d=>[d.column, nextDepartures(d.minutes,sec,r.run,r.max,dayData.horizon,dayData.cutoff)
+          .map(([i,mins],cnt)=>{
+            const m=d.minutes[i], ty=dayData.types[d.ty[i]], de=dayData.dests[d.de[i]];
+            const parts=[`${pad2(Math.floor(m/60)%24)}:${pad2(m%60)}発`];
+            if(!skip(ty)) parts.push(`【${ty}】`);
+            if(!skip(de)) parts.push(`${de}行`);
+            parts.push(`- ${mins}分 ${mins>=r.walk?"歩けば間に合います":"走れば間に合います"}`);
+            return `${labs[cnt]}: ${parts.join(" ")}`;
+          })]))}))};
+      renderSchedule(scheduleJson);
+    }
+
+    /* 差分 (変化した路線のみ) を scheduleJson に反映 */
+    function mergeSchedule(js){
+      if(!scheduleJson.routes){ scheduleJson=js; return; }
+      const byLabel=new Map(js.routes.map(r=>[r.label,r]));
+      const routes=scheduleJson.routes.map(r=>byLabel.get(r.label)||r);
+      js.routes.forEach(r=>{
+        if(!routes.some(x=>x.label===r.label)){ routes.push(r); routesInit=false; }
+      });
+      scheduleJson={...js, routes};
+    }
+
+    /* ============================ プッシュ配信 (SSE) ============================ */
+    let stream = null, pollTimers = [];
+    const STREAM_RETRY = 300000;   /* 断られた (503 など) 後に SSE を試し直すまで。その間はポーリング */
+    function startStream(){
+      stream = new EventSource("/api/stream?"+SCOPE_QS+(localSchedule?"&schedule=0":""));
+      stream.addEventListener("open",stopPolling);
+      stream.addEventListener("schedule",e=>{ mergeSchedule(JSON.parse(e.data)); renderSchedule(scheduleJson); });
+      stream.addEventListener("status" ,e=>applyStatus(JSON.parse(e.data)));
+      stream.addEventListener("news"   ,e=>applyNews(JSON.parse(e.data)));
+      stream.addEventListener("weather",e=>drawWeather(JSON.parse(e.data)));
+      stream.addEventListener("error",()=>{
+        /* 通信断ならブラウザが自動で再接続する。CLOSED (サーバーが断った) の時だけポーリングに切り替える */
+        if(!stream||stream.readyState!==EventSource.CLOSED) return;
+        stopStream(); startPolling();
+        addTimer(setTimeout(()=>{ if(!stream) startStream(); },STREAM_RETRY));
+      });
+    }
+    function stopStream(){ if(stream){ stream.close(); stream=null; } }
+
+    /* SSE が使えない時の従来のポーリング */
+    function startPolling(){
+      if(pollTimers.length) return;
+      pollTimers=[
+        setInterval(loadStatus  ,60000),
+        setInterval(loadWeather,600000),
+        setInterval(()=>{ if(!localSchedule) loadSchedule(); },30000),
+        setInterval(loadNews   ,30000),
+      ];
+    }
+    function stopPolling(){ pollTimers.forEach(clearInterval); pollTimers=[]; }
   
     /* ============================ UI バインド ============================ */
     zoomSl.addEventListener("input",()=>{
@@ -315,22 +430,21 @@ document.addEventListener("DOMContentLoaded", () => {
   
     /* ============================ タイマー管理 ============================ */
     function addTimer(id){timers.add(id);}
-    function clearAllTimers(){timers.forEach(clearInterval); timers.clear();}
+    function clearAllTimers(){timers.forEach(clearInterval); timers.clear(); stopStream(); stopPolling();}
     function startTimers(){
-      addTimer(setInterval(updateClock ,1000));
+      addTimer(setInterval(()=>{updateClock(); tickSchedule();},1000));
+      addTimer(setInterval(()=>{ if(localSchedule) loadDay(); },300000));   /* 時刻表の更新確認 (変化なしなら 304) */
       addTimer(setInterval(()=>{statusIdx=(statusIdx+1)%statusArr.length; drawStatus();},5000));
-      addTimer(setInterval(loadStatus  ,60000));
-      addTimer(setInterval(loadWeather,600000));
-      addTimer(setInterval(loadSchedule,30000));
-      addTimer(setInterval(loadNews   ,30000));
       addTimer(setInterval(newsCycle  ,4000));
+      /* データ更新は SSE で受け取る。非対応ブラウザ・サーバーに断られた間は従来のポーリング */
+      if(window.EventSource) startStream(); else startPolling();
     }
   
     /* ============================ 初期化 ============================ */
     document.body.style.zoom=zoomSl.value+"%";
     document.body.style.fontSize=fontSl.value+"%";
     resizeChk.dispatchEvent(new Event("change"));
-    updateClock();   loadStatus(); loadWeather(); loadSchedule(); loadNews();
+    updateClock();   loadStatus(); loadWeather(); loadDay(); loadNews();
     startTimers();
   });
   
\ No newline at end of file
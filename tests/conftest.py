@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""リポジトリ直下のモジュール (timetable_app など) を tests/ から import できるようにする"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
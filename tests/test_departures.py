@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""次の発車: Timetable.next_departures と DepartureBatch.select が深夜の跨ぎも含めて一致すること"""
+
+import pytest
+
+import timetable_app as ta
+
+CUTOFF = ta.SERVICE_DAY_CUTOFF
+ROWS = [
+    {"time": "03:10", "type": "各停", "dest": "渋谷"},   # 営業日の始発 (区切り直後)
+    {"time": "05:00", "type": "急行", "dest": "横浜"},
+    {"time": "05:00", "type": "各停", "dest": "横浜"},   # 同じ分に 2 本
+    {"time": "12:34", "type": "", "dest": "大井町"},
+    {"time": "23:50", "type": "各停", "dest": "渋谷"},
+    {"time": "00:10", "type": "各停", "dest": "元住吉"},  # 深夜帯 (前日の営業日の続き = 24:10)
+    {"time": "01:30", "type": "", "dest": "-"},
+    {"time": "02:55", "type": "", "dest": "-"},          # 営業日の終わり (26:55)
+]
+
+
+def test_rows_are_sorted_in_service_order():
+    tt = ta.Timetable.from_rows(ROWS)
+    assert list(tt.minutes) == [190, 300, 300, 754, 1430, 1450, 1530, 1615]
+
+
+def test_wraps_to_the_first_train_of_the_next_service_day():
+    tt = ta.Timetable.from_rows(ROWS)
+    now = (26 * 60 + 50) * 60   # 翌日 02:50 (まだ前日の営業日)
+    assert tt.next_departures(now, run=0, limit=3) == [(7, 5), (0, 20)]
+    assert tt.next_departures(now, run=0, limit=3, horizon=15) == [(7, 5)]
+    assert tt.next_departures(now + 10 * 60, run=0, limit=1) == [(0, 10)]
+
+
+def test_run_and_limit():
+    tt = ta.Timetable.from_rows(ROWS)
+    now = 4 * 3600 + 45 * 60 + 30   # 04:45:30 ➜ 05:00 まで残り 14 分 (切り捨て)
+    assert tt.next_departures(now, run=0, limit=5) == [(1, 14), (2, 14)]
+    assert tt.next_departures(now, run=0, limit=1) == [(1, 14)]
+    assert tt.next_departures(now, run=15, limit=5) == []
+
+
+@pytest.mark.skipif(ta.np is None, reason="numpy が無ければ DepartureBatch は next_departures をそのまま使う")
+def test_batch_agrees_with_bisect_across_the_service_day():
+    tables = [ta.Timetable.from_rows(ROWS), ta.EMPTY_TIMETABLE, ta.Timetable.from_rows(ROWS[3:5]),
+              ta.Timetable.from_rows([{"time": f"{h:02d}:{m:02d}"} for h in range(24) for m in (0, 20, 40)])]
+    run, limit, walk = [0, 2, 5, 1], [3, 3, 1, 4], [4, 0, 6, 2]
+    batch = ta.DepartureBatch(tables, run, limit, walk)
+    for now in range(0, (24 + CUTOFF) * 3600, 97):
+        for horizon in (60, 300):
+            want = [[(i, m, m >= w) for i, m in tt.next_departures(now, r, lim, horizon)]
+                    for tt, r, lim, w in zip(tables, run, limit, walk)]
+            assert batch.select(now, horizon) == want, now
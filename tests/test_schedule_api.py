@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""/api/schedule の ETag / 304 (gzip 版は別の ETag) と /api/schedule/day の版つき URL"""
+
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+import timetable_app as ta
+
+NOW = datetime(2026, 10, 14, 8, 30, 15)   # 平日の朝
+
+
+class _FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(ta, "datetime", _FrozenDatetime)
+    ta.SCHEDULE_CACHE.clear()
+    ta.DAY_SCHEDULE_CACHE.clear()
+    yield ta.app.test_client()
+    ta.SCHEDULE_CACHE.clear()
+    ta.DAY_SCHEDULE_CACHE.clear()
+
+
+def test_etag_and_304(client):
+    first = client.get("/api/schedule")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert "no-cache" in first.headers["Cache-Control"]
+    assert "Accept-Encoding" in first.headers["Vary"]
+
+    again = client.get("/api/schedule", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == etag
+
+    other = client.get("/api/schedule", headers={"If-None-Match": '"0000000000000000"'})
+    assert other.status_code == 200
+    assert other.data == first.data
+
+
+def test_gzip_variant_has_its_own_etag(client):
+    plain = client.get("/api/schedule")
+    gz = client.get("/api/schedule", headers={"Accept-Encoding": "gzip"})
+    if gz.headers.get("Content-Encoding") != "gzip":
+        pytest.skip("本文が小さく圧縮版を持たない")
+    assert gzip.decompress(gz.data) == plain.data
+    etag = gz.headers["ETag"]
+    assert etag.endswith('-gz"') and etag != plain.headers["ETag"]
+    assert client.get("/api/schedule", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+    # 非圧縮版の ETag では gzip 版を 304 にしない
+    assert client.get("/api/schedule", headers={"Accept-Encoding": "gzip",
+                                                "If-None-Match": plain.headers["ETag"]}).status_code == 200
+
+
+def test_day_schedule_is_immutable_only_with_current_version(client):
+    version = json.loads(client.get("/api/schedule").data)["day_version"]
+    bare = client.get("/api/schedule/day")
+    assert "no-cache" in bare.headers["Cache-Control"]
+    pinned = client.get(f"/api/schedule/day?v={version}")
+    assert pinned.status_code == 200
+    assert "immutable" in pinned.headers["Cache-Control"] and "no-cache" not in pinned.headers["Cache-Control"]
+    stale = client.get("/api/schedule/day?v=0000000000000000")
+    assert "no-cache" in stale.headers["Cache-Control"]
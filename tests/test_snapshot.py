@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""時刻表スナップショット: 書いて読み戻すと同じ表になり、前提が変われば使わないこと"""
+
+import os
+
+import pytest
+
+import timetable_app as ta
+
+TRAIN = ta.Timetable.from_rows([
+    {"time": "05:12", "type": "急行", "dest": "渋谷"},
+    {"time": "23:58", "type": "各停", "dest": "大井町"},
+    {"time": "00:41", "type": "", "dest": "元住吉"},
+])
+BUS = ta.Timetable.from_rows(["07:00", "07:15", "21:30"])
+
+
+def _write(path, tables):
+    ta.TimetableSnapshot.write(path, tables)
+    return ta.TimetableSnapshot(path)
+
+
+def test_round_trip(tmp_path):
+    snap = _write(tmp_path / "t.snap", {"train/a": (111, TRAIN), "bus/b": (222, BUS), "empty": (333, ta.EMPTY_TIMETABLE)})
+    for key, mtime, tt in (("train/a", 111, TRAIN), ("bus/b", 222, BUS), ("empty", 333, ta.EMPTY_TIMETABLE)):
+        got = snap.lookup(key, mtime)
+        assert got is not None
+        assert list(got.minutes) == list(tt.minutes)
+        assert tuple(got.types) == tuple(tt.types)
+        assert tuple(got.dests) == tuple(tt.dests)
+
+
+def test_lookup_misses_on_mtime_or_key(tmp_path):
+    snap = _write(tmp_path / "t.snap", {"train/a": (111, TRAIN)})
+    assert snap.lookup("train/a", 112) is None
+    assert snap.lookup("train/b", 111) is None
+
+
+def test_rejects_other_cutoff_and_garbage(tmp_path, monkeypatch):
+    path = tmp_path / "t.snap"
+    ta.TimetableSnapshot.write(path, {"train/a": (111, TRAIN)})
+    monkeypatch.setattr(ta, "SERVICE_DAY_CUTOFF", ta.SERVICE_DAY_CUTOFF + 1)
+    with pytest.raises(ValueError, match="stale"):
+        ta.TimetableSnapshot(path)
+    bad = tmp_path / "bad.snap"
+    bad.write_bytes(b"not a snapshot at all" * 4)
+    with pytest.raises(ValueError):
+        ta.TimetableSnapshot(bad)
+
+
+def test_store_serves_from_snapshot_without_parsing(tmp_path):
+    csv = tmp_path / "a.csv"
+    csv.write_text("dummy", encoding="utf-8")
+    mtime = csv.stat().st_mtime_ns
+    snap = tmp_path / "t.snap"
+    ta.TimetableSnapshot.write(snap, {"train/a": (mtime, TRAIN)})
+
+    def loader(path):
+        raise AssertionError("スナップショットにあるのにパースした")
+
+    store = ta.TimetableStore(snap)
+    store.open_snapshot()
+    assert list(store.get("train/a", csv, loader).minutes) == list(TRAIN.minutes)
+    assert store.parsed == 0
+
+    csv.write_text("changed", encoding="utf-8")
+    os.utime(csv, ns=(mtime + 10**9, mtime + 10**9))
+    store2 = ta.TimetableStore(snap)
+    store2.open_snapshot()
+    assert list(store2.get("train/a", csv, lambda p: ["06:00"]).minutes) == [360]
+    assert store2.parsed == 1
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""東急の運行情報ページ: 変化検出のハッシュ範囲 = 解析する範囲"""
+
+import pytest
+
+import timetable_app as ta
+
+NORMAL = "<li><time>8:00</time>東横線 平常運転</li>"
+DELAY = "<li><time>8:05</time>目黒線 遅延が発生しています</li>"
+
+
+def page(second: str, head: str = "") -> bytes:
+    return (f"<html><head>{head}</head><body>"
+            f'<nav><ul><li>ホーム</li></ul></nav>'
+            f'<div class="box service-info"><ul>{NORMAL}</ul><ul>{second}</ul></div>'
+            f"<footer><ul><li>フッタ</li></ul></footer></body></html>").encode("utf-8")
+
+
+class _Resp:
+    def __init__(self, content: bytes) -> None:
+        self.content = content
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """HTTP.get が返すページを差し替える"""
+    monkeypatch.setattr(ta, "_tokyu_last", None)
+    current = {}
+    monkeypatch.setattr(ta.HTTP, "get", lambda url, **kw: _Resp(current["body"]))
+
+    def set_body(body: bytes) -> None:
+        current["body"] = body
+    return set_body
+
+
+def test_section_covers_every_list_in_the_box():
+    body = page(DELAY)
+    start, end = ta.tokyu_section(body)
+    assert body[start:end].startswith(b'<div class="box service-info">')
+    assert body[start:end].endswith(b"</ul></div>")
+    assert [txt for _, txt in ta.parse_tokyu(body[start:end])] == ["東横線 平常運転", "目黒線 遅延が発生しています"]
+
+
+def test_change_in_second_list_is_not_reported_unchanged(serve):
+    serve(page(""))
+    assert ta.fetch_tokyu() == []
+    serve(page(DELAY))
+    recs = ta.fetch_tokyu()
+    assert [r["line"] for r in recs] == ["目黒線"]
+    assert recs[0]["severity"] == "delay"
+
+
+def test_stylesheet_mention_does_not_anchor_the_section(serve):
+    css = "<style>.service-info{color:red}</style><script>var c = 'service-info';</script>"
+    body = page(DELAY, head=css)
+    start, _ = ta.tokyu_section(body)
+    assert body[start:].startswith(b'<div class="box service-info">')
+
+    serve(page("", head=css))
+    assert ta.fetch_tokyu() == []
+    serve(body)
+    assert [r["line"] for r in ta.fetch_tokyu()] == ["目黒線"]
+
+
+def test_header_change_outside_the_section_skips_parsing(serve):
+    serve(page(DELAY))
+    first = ta.fetch_tokyu()
+    serve(page(DELAY, head="<title>更新</title>"))
+    assert ta.fetch_tokyu() is first
+
+
+def test_page_without_section(serve):
+    assert ta.tokyu_section(b"<style>.service-info{}</style><ul><li>x</li></ul>") is None
+    serve(b"<html><body>maintenance</body></html>")
+    assert ta.fetch_tokyu() is None
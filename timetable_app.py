@@ -13,21 +13,52 @@ FULL SOURCE rev-2025-05-18  (★ CSV 対応版)
 """
 
 from __future__ import annotations
-from datetime import datetime, timedelta
-from functools import lru_cache
+from array import array
+from collections import deque
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from html.parser import HTMLParser
+from itertools import accumulate
 from pathlib import Path
+from typing import Callable, Iterator, NamedTuple, Sequence
+import cProfile
+import codecs
+import csv
+import gzip
+import hashlib
 import html
-import requests
-import pandas as pd
+import io
+import json
+import mimetypes
+import mmap
+import os
+import pstats
+import re
+import struct
+import sys
+import threading
+import time
 import feedparser
-from bs4 import BeautifulSoup
-from flask import Flask, jsonify, render_template
+from assets import build as build_assets
+from flask import Flask, Response, g, jsonify, render_template, request, send_from_directory
+from fswatch import DirWatcher
+from http_client import HttpClient, HttpResult
+try:
+    import fcntl   # ワーカー間のリーダー選出 (Unix のみ)
+except ImportError:
+    fcntl = None
+try:
+    import numpy as np   # 発車案内の一括計算 (無ければ方面ごとに二分探索)
+except ImportError:
+    np = None
+from metrics import LOG, METRICS, end_trace, server_timing, start_trace
+from timetable_common import BASE_DIR, DATA_DIR, SERVICE_DAY_CUTOFF, to_service_minutes
 
 # ──────────────────────────────────────────
 #  ディレクトリ・ファイルパス定義
 # ──────────────────────────────────────────
-BASE_DIR   = Path(__file__).resolve().parent              # timetable-app/
-DATA_DIR   = BASE_DIR / "timetable_data"                  # ★ 時刻表置き場 (CSV/Excel)
+# BASE_DIR・DATA_DIR (★ 時刻表置き場) は timetable_common で定義 (インポータと共有)
 STATIC_DIR = BASE_DIR / "static"                          # 画像・CSS・JS
 
 # バス Excel ファイル
@@ -38,150 +69,228 @@ bus_timetable_file3 = DATA_DIR / "timetablebus3.xlsx"
 # Flask アプリ
 app = Flask(__name__, static_folder=str(STATIC_DIR), template_folder="templates")
 
+# 上流 API 共通の HTTP クライアント (keep-alive・条件付き GET・サーキットブレーカー)
+HTTP = HttpClient(timeout=6, metrics=METRICS)
+
+# ──────────────────────────────────────────
+#  営業日カレンダー (平日 / 土曜 / 休日 ダイヤの判定)
+# ──────────────────────────────────────────
+# SERVICE_DAY_CUTOFF (営業日の区切り, 時) は timetable_common で定義 (インポータと共有)
+DAY_TYPES = ("weekday", "saturday", "holiday")
+HOLIDAYS_FILE = DATA_DIR / "holidays.csv"   # "YYYY-MM-DD,名称" (振替休日・国民の休日も含めて列挙)
+
+
+class ServiceCalendar:
+    """
+    日時 ➜ 営業日 ➜ ダイヤ種別 (weekday / saturday / holiday)。
+      ・SERVICE_DAY_CUTOFF 時より前は前日の営業日 (土曜 0:40 は金曜の平日ダイヤの続き)
+      ・日曜と祝日表にある日は holiday
+    祝日表はネットに取りに行かず timetable_data/holidays.csv を使う (年末年始ダイヤなど
+    事業者独自の休日もここに足せばよい)。判定結果は営業日ごとに覚えておく。
+    """
+
+    def __init__(self, holidays_file: Path | None = None, cutoff: int = SERVICE_DAY_CUTOFF) -> None:
+        self.cutoff = cutoff
+        self.holidays: dict[date, str] = {}
+        self._types: dict[date, str] = {}
+        self._warned = False
+        if holidays_file is not None:
+            self.load(holidays_file)
+
+    def load(self, path: Path) -> None:
+        """祝日表を読み込む (読めなければ土日だけで判定する)"""
+        holidays: dict[date, str] = {}
+        try:
+            with open(path, encoding="utf-8-sig", newline="") as f:
+                for row in csv.reader(f):
+                    try:
+                        holidays[date.fromisoformat(row[0].strip())] = row[1].strip() if len(row) > 1 else ""
+                    except (IndexError, ValueError):
+                        continue   # ヘッダ行・空行
+        except OSError as e:
+            LOG.warn(f"祝日表を読み込めません ({e})。土日のみで判定します")
+        self.holidays = holidays
+        self._types = {}
+        self._warned = False
+
+    def service_date(self, now: datetime) -> date:
+        return (now - timedelta(hours=self.cutoff)).date()
+
+    def day_end(self, day: date) -> datetime:
+        """営業日 day が終わる (次の営業日に切り替わる) 日時"""
+        return datetime.combine(day + timedelta(days=1), datetime.min.time()) + timedelta(hours=self.cutoff)
+
+    def day_type_of(self, day: date) -> str:
+        t = self._types.get(day)
+        if t is None:
+            if self.holidays and day > max(self.holidays) and not self._warned:
+                self._warned = True
+                LOG.warn(f"祝日表が {max(self.holidays)} までしかありません。holidays.csv を更新してください")
+            if day.weekday() == 6 or day in self.holidays:
+                t = "holiday"
+            elif day.weekday() == 5:
+                t = "saturday"
+            else:
+                t = "weekday"
+            self._types[day] = t
+        return t
+
+    def day_type(self, now: datetime | None = None) -> str:
+        """now (既定: 現在) の営業日のダイヤ種別"""
+        return self.day_type_of(self.service_date(now or datetime.now()))
+
+
+CALENDAR = ServiceCalendar(HOLIDAYS_FILE)
+
+
 # ──────────────────────────────────────────
 #  ユーティリティ : 電車 (CSV)
 # ──────────────────────────────────────────
 # _DEST_MAP は ROUTES に移行するため削除
 
-_DAY_MAP = {   # datetime.weekday() ➜ ファイル名用タグ
-    0: "weekday", 1: "weekday", 2: "weekday", 3: "weekday", 4: "weekday",
-    5: "holiday",  # 土曜日も休日ダイヤを参照するように変更
-    6: "holiday",
+_DAY_MAP = {   # ダイヤ種別 ➜ ファイル名用タグ
+    "weekday": "weekday",
+    "saturday": "holiday",  # 土曜日も休日ダイヤを参照するように変更
+    "holiday": "holiday",
 }
 
+def train_csv_path(line_code: str, dest_tag: str, day: str) -> Path:
+    """ダイヤ種別 (weekday / saturday / holiday) に対応する電車 CSV のパスを返す"""
+    return DATA_DIR / f"timetable_{line_code}_{_DAY_MAP[day]}_{dest_tag}.csv"
+
+
 def fetch_train_schedule(line_code: str, dest_tag: str) -> list[dict[str, str]]:
     """
     指定された路線の電車時刻表を CSV から読み込んで
     {"time": "HH:MM", "type": "種別", "dest": "行き先"} の辞書のリストを返す
       line_code: "OM", "TY", "MG", "BL" など
       dest_tag : "Ooimachi", "Mizonokuchi", "Shibuya", "Yokohama", "Meguro", "Hiyoshi", "Azamino", "Shonandai" など
+    ※ 毎回ファイルを読む。発車案内 API は TIMETABLES (メモリ上のストア) 経由で参照する
     """
-    # 1) 対象 CSV ファイル決定
-    today_tag = _DAY_MAP[datetime.now().weekday()]
-    csv_path  = DATA_DIR / f"timetable_{line_code}_{today_tag}_{dest_tag}.csv"
+    return read_train_csv(train_csv_path(line_code, dest_tag, CALENDAR.day_type()))
 
-    # ブルーライン用のデバッグ出力を追加
-    if line_code == "BL":
-        print(f"[DEBUG] 読み込み試行: {csv_path} (存在: {csv_path.exists()})")
 
-    if not csv_path.exists():
-        print(f"[WARN] CSV not found: {csv_path}")
-        return []
+def read_train_csv(csv_path: Path) -> list[dict[str, str]]:
+    """電車時刻表 CSV (時刻, 種別, 行先, ...) を読み込んで辞書のリストを返す"""
+    if LOG.enabled("DEBUG"):
+        LOG.debug(f"読み込み試行: {csv_path}")
 
-    # 2) CSV 読込
-    df = None
+    # 2) CSV 読込 (存在確認は別に stat せず、開けなかった時に判断する)
     try:
-        # header=0 を明示し、1行目をヘッダーとして扱う
-        # keep_default_na=False で、空欄を空文字列として読み込む
-        # dtype=str を追加して、すべての列を文字列として読み込むことで、予期せぬ型変換を防ぐ
-        df = pd.read_csv(csv_path, encoding="utf-8", header=0, keep_default_na=False, dtype=str)
-    except UnicodeDecodeError:
-        try:
-            df = pd.read_csv(csv_path, encoding="cp932", header=0, keep_default_na=False, dtype=str)
-        except Exception as e_cp932:
-            print(f"[ERROR] CSV read error (cp932): {csv_path} - {e_cp932}")
-            return []
+        num_columns, rows = read_csv_rows(csv_path)
+    except FileNotFoundError:
+        LOG.warn(f"CSV not found: {csv_path}", key=f"csv:{csv_path}")
+        return []
     except Exception as e:
-        print(f"[ERROR] CSV read error (utf-8): {csv_path} - {e}")
+        LOG.error(f"CSV read error: {csv_path} - {e}", key=f"csv:{csv_path}")
         return []
 
-    if df is None or df.empty:
-        # print(f"[INFO] CSV is empty or failed to load: {csv_path}") # 既に読み込み失敗時にエラーが出るため、重複を避ける
+    if not rows:
         return []
 
     # 3) 時刻・種別・行き先抽出
     out: list[dict[str, str]] = []
-    
-    num_columns = len(df.columns)
+
     if num_columns == 0:
-        print(f"[WARN] CSV has no columns: {csv_path}")
+        LOG.warn(f"CSV has no columns: {csv_path}")
         return []
 
-    # デバッグ用に列名を出力したい場合は以下のコメントを解除
-    # print(f"[DEBUG] CSV Columns for {csv_path}: {df.columns.tolist()}") 
+    for row in rows:
+        formatted_time = _normalize_hhmm(row[0])
+        if formatted_time is None:
+            continue
+
+        train_type = row[1].strip() if num_columns > 1 else ""
+        destination = row[2].strip() if num_columns > 2 else ""
 
-    for index, row in df.iterrows():
-        try:
-            time_str = str(row.iloc[0]).strip()
-            if not time_str:
-                # print(f"[DEBUG] Skipping row due to empty time: {row.to_list()} in {csv_path}")
-                continue
-            
-            try:
-                # "H:MM" または "HH:MM" 形式をパースし、"HH:MM" に正規化
-                parts = time_str.split(':')
-                if len(parts) == 2:
-                    h, m = int(parts[0]), int(parts[1])
-                    formatted_time = f"{h:02d}:{m:02d}"
-                    datetime.strptime(formatted_time, "%H:%M") # 正当性チェック
-                else:
-                    # print(f"[DEBUG] Skipping row due to invalid time format '{time_str}': {row.to_list()} in {csv_path}")
-                    continue
-            except ValueError:
-                # print(f"[DEBUG] Skipping row due to invalid time format '{time_str}': {row.to_list()} in {csv_path}")
-                continue
+        if train_type.lower() in ["nan", "na", "<na>", "-", "ー"]: train_type = ""
+        if destination.lower() in ["nan", "na", "<na>", "-", "ー"]: destination = ""
 
-            train_type = ""
-            if num_columns > 1:
-                train_type = str(row.iloc[1]).strip()
-            
-            destination = ""
-            if num_columns > 2:
-                destination = str(row.iloc[2]).strip()
-            
-            if train_type.lower() in ["nan", "na", "<na>", "-", "ー"]: train_type = ""
-            if destination.lower() in ["nan", "na", "<na>", "-", "ー"]: destination = ""
-
-            out.append({
-                "time": formatted_time,
-                "type": train_type,
-                "dest": destination
-            })
-        except (ValueError, TypeError) as e_parse:
-            # print(f"[DEBUG] Skipping row due to parse error ({e_parse}): {row.to_list()} in {csv_path}")
-            pass
-        except IndexError as e_index: 
-            # print(f"[DEBUG] Skipping row due to IndexError ({e_index}): {row.to_list()} in {csv_path}")
-            pass
-            
-    if not out and not df.empty: # CSVにデータ行はあるが、有効な時刻情報が抽出できなかった場合
-        print(f"[INFO] No valid schedule entries extracted from {csv_path}. Please check CSV format (time in 1st col, etc.) and content.")
-        # さらに詳細なデバッグが必要な場合、以下のコメントを解除
-        # print(f"[DEBUG] First 5 rows of CSV {csv_path} that might have issues:\n{df.head().to_string()}")
+        out.append({
+            "time": formatted_time,
+            "type": train_type,
+            "dest": destination
+        })
+
+    if not out: # CSVにデータ行はあるが、有効な時刻情報が抽出できなかった場合
+        LOG.info(f"No valid schedule entries extracted from {csv_path}. Please check CSV format (time in 1st col, etc.) and content.")
 
     return sorted(out, key=lambda x: x["time"])
 
 
+def read_csv_rows(csv_path: Path) -> tuple[int, list[list[str]]]:
+    """
+    CSV を 1 回だけ読み、(ヘッダーの列数, データ行のリスト) を返す。
+    文字コードは UTF-8 (BOM 可) でデコードできなければ cp932 とみなす。
+    データ行は空行を除き、ヘッダーの列数まで "" で埋める
+    """
+    raw = csv_path.read_bytes()
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = raw.decode("cp932")
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, [])
+    width = len(header)
+    rows = [r + [""] * (width - len(r)) for r in reader if r and any(r)]
+    return width, rows
+
+
+def _normalize_hhmm(time_str: str) -> str | None:
+    """"H:MM" または "HH:MM" ➜ "HH:MM"。時刻として不正なら None"""
+    parts = time_str.strip().split(":")
+    if len(parts) != 2:
+        return None
+    try:
+        h, m = int(parts[0]), int(parts[1])
+    except ValueError:
+        return None
+    if not (0 <= h < 24 and 0 <= m < 60):
+        return None
+    return f"{h:02d}:{m:02d}"
+
+
 # ──────────────────────────────────────────
 #  ユーティリティ : バス (従来どおり Excel)
 # ──────────────────────────────────────────
 def fetch_bus_schedule(sheet: str, col: str, path: Path) -> list[str]:
     """バス時刻表（行方向：時、列方向：分）を HH:MM リストで返す"""
-    df = pd.read_excel(path, sheet_name=sheet)
-    if "時" not in df.columns:
-        df.rename(columns={df.columns[0]: "時"}, inplace=True)
-    if col not in df.columns:
-        col = df.columns[1]
-    out = []
-    for _, row in df.iterrows():
-        h = str(row["時"]).strip()
-        if not h.isdigit() or pd.isna(row[col]):
-            continue
-        for m in str(row[col]).split():
-            if m.isdigit():
-                out.append(f"{h.zfill(2)}:{m.zfill(2)}")
-    return out
+    from openpyxl import load_workbook   # バス Excel を読む時だけ import する
 
-
-def sheet_name(kind: str, key: str | None = None) -> str:
-    """曜日判定してシート名を返すヘルパ（バス用のみ）"""
-    wd = datetime.now().weekday()
+    # read_only=True で行を順に読むだけにする (ブック全体のセルを作らない)
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet].iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else "" for c in next(rows, ())]
+        if len(header) < 2:
+            return []
+        # 1 列目が時。分の列は見出しが col の列、無ければ 2 列目
+        ci = header.index(col, 1) if col in header[1:] else 1
+        out = []
+        for row in rows:
+            if len(row) <= ci or row[ci] is None:
+                continue
+            h = str(row[0]).strip() if row[0] is not None else ""
+            if not h.isdigit():
+                continue
+            for m in str(row[ci]).split():
+                if m.isdigit():
+                    out.append(f"{h.zfill(2)}:{m.zfill(2)}")
+        return out
+    finally:
+        wb.close()
+
+
+def sheet_name(kind: str, key: str | None = None, day: str | None = None) -> str:
+    """ダイヤ種別に対応するシート名を返すヘルパ（バス用のみ）"""
+    if day is None:
+        day = CALENDAR.day_type()
     if kind in ("bus", "bus_2"):
-        return f"{'平日' if wd < 5 else '土休日'}_{key}"
+        return f"{'平日' if day == 'weekday' else '土休日'}_{key}"
     if kind == "bus_3":
-        if wd < 5:
+        if day == "weekday":
             return f"平日_{key}"
-        if wd == 5:
+        if day == "saturday":
             return f"土曜_{key}"
         return f"日休日_{key}"
     raise ValueError("kind error")
@@ -196,119 +305,486 @@ def remaining(dep_time: str) -> timedelta:
     return dep - now
 
 
+def bus_csv_path(dest_tag: str, day: str) -> Path:
+    """ダイヤ種別 (weekday / saturday / holiday) に対応するバス CSV のパスを返す"""
+    return DATA_DIR / f"timetable_BUS_{day}_{dest_tag}.csv"
+
+
 def fetch_bus_schedule_csv(bus_type: str, dest_tag: str) -> list[dict[str, str]]:
     """
     バス時刻表をCSVから読み込んで電車と同じ形式で返す
     {"time": "HH:MM", "type": "", "dest": "行き先"} の辞書のリスト
     """
-    # 曜日に応じたファイル選択
-    wd = datetime.now().weekday()
-    day_tag = "weekday"
-    if wd == 5:  # 土曜日
-        day_tag = "saturday"
-    elif wd == 6:  # 日曜日
-        day_tag = "holiday"
-    
-    # CSVファイルパス
-    csv_path = DATA_DIR / f"timetable_BUS_{day_tag}_{dest_tag}.csv"
-    
-    print(f"[DEBUG] バスCSV読み込み試行: {csv_path} (存在: {csv_path.exists()})")
-    
-    if not csv_path.exists():
-        print(f"[WARN] バスCSV not found: {csv_path}")
-        return []
-    
-    # CSV読込
-    df = None
+    return read_bus_csv(bus_csv_path(dest_tag, CALENDAR.day_type()))
+
+
+def read_bus_csv(csv_path: Path) -> list[dict[str, str]]:
+    """バス時刻表 CSV (時刻, 行先, ...) を読み込んで辞書のリストを返す"""
+    if LOG.enabled("DEBUG"):
+        LOG.debug(f"バスCSV読み込み試行: {csv_path}")
+
+    # CSV読込 (存在確認は別に stat せず、開けなかった時に判断する)
     try:
-        df = pd.read_csv(csv_path, encoding="utf-8", header=0, keep_default_na=False, dtype=str)
-    except UnicodeDecodeError:
-        try:
-            df = pd.read_csv(csv_path, encoding="cp932", header=0, keep_default_na=False, dtype=str)
-        except Exception as e_cp932:
-            print(f"[ERROR] バスCSV read error (cp932): {csv_path} - {e_cp932}")
-            return []
-    except Exception as e:
-        print(f"[ERROR] バスCSV read error (utf-8): {csv_path} - {e}")
+        num_columns, rows = read_csv_rows(csv_path)
+    except FileNotFoundError:
+        LOG.warn(f"バスCSV not found: {csv_path}", key=f"csv:{csv_path}")
         return []
-    
-    if df is None or df.empty:
+    except Exception as e:
+        LOG.error(f"バスCSV read error: {csv_path} - {e}", key=f"csv:{csv_path}")
         return []
-    
+
     # 時刻・行き先抽出
     out = []
-    for _, row in df.iterrows():
-        try:
-            time_str = str(row.iloc[0]).strip()
-            if not time_str:
+    for row in rows:
+        formatted_time = _normalize_hhmm(row[0])
+        if formatted_time is None:
+            continue
+
+        # 行き先
+        destination = row[1].strip() if num_columns > 1 else ""
+        if destination.lower() in ["nan", "na", "<na>", "-", "ー"]:
+            destination = ""
+
+        out.append({
+            "time": formatted_time,
+            "type": "",  # バスの種別は空
+            "dest": destination
+        })
+
+    return sorted(out, key=lambda x: x["time"])
+
+
+# ──────────────────────────────────────────
+#  時刻表ストア (一度だけ読み込み、mtime が変わった時のみ再読込)
+# ──────────────────────────────────────────
+def service_seconds(now: datetime) -> int:
+    """現在時刻 ➜ 営業日 0:00 からの経過秒 (深夜帯は 24 時以降として数える)"""
+    return to_service_minutes(now.hour, now.minute) * 60 + now.second
+
+
+def fmt_minutes(minutes: int) -> str:
+    """営業日の分 ➜ 表示用 "HH:MM" (24:10 ➜ 00:10)"""
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+
+class Timetable(NamedTuple):
+    """
+    1 つの (路線, 方面, 曜日種別) の時刻表。各列を並行配列で保持する。
+    minutes は営業日の分でソート済みなので、次の発車は二分探索で引ける。
+    (スナップショットから読んだ場合、各列は mmap 上の memoryview を指す)
+    """
+    minutes: Sequence[int]   # 発車時刻 (営業日の分, 昇順)
+    types: Sequence[str]     # 種別 (バスは "")
+    dests: Sequence[str]     # 行き先
+
+    @classmethod
+    def from_rows(cls, rows: list) -> "Timetable":
+        """fetch 系関数の戻り値 (辞書 or "HH:MM" 文字列のリスト) から生成"""
+        recs = []
+        for item in rows:
+            if isinstance(item, dict):
+                time_str, typ, dest = item["time"], item.get("type", ""), item.get("dest", "")
+            elif isinstance(item, str):
+                time_str, typ, dest = item, "", ""
+            else:
                 continue
-            
-            # 時刻のフォーマット
             try:
-                parts = time_str.split(':')
-                if len(parts) == 2:
-                    h, m = int(parts[0]), int(parts[1])
-                    formatted_time = f"{h:02d}:{m:02d}"
-                    datetime.strptime(formatted_time, "%H:%M")  # 正当性チェック
-                else:
-                    continue
+                h, m = time_str.split(":")
+                # 種別・行き先は表をまたいで同じ文字列オブジェクトを共有する
+                recs.append((to_service_minutes(int(h), int(m)), sys.intern(typ.strip()), sys.intern(dest.strip())))
             except ValueError:
                 continue
-            
-            # 行き先
-            destination = ""
-            if len(df.columns) > 1:
-                destination = str(row.iloc[1]).strip()
-            
-            if destination.lower() in ["nan", "na", "<na>", "-", "ー"]:
-                destination = ""
-            
-            out.append({
-                "time": formatted_time,
-                "type": "",  # バスの種別は空
-                "dest": destination
-            })
-        except (ValueError, TypeError, IndexError):
-            pass
-    
-    return sorted(out, key=lambda x: x["time"])
+        recs.sort(key=lambda x: x[0])
+        return cls(array("H", (x[0] for x in recs)),
+                   tuple(x[1] for x in recs), tuple(x[2] for x in recs))
+
+    def next_departures(self, now_sec: int, run: int, limit: int,
+                        horizon: int = 60) -> list[tuple[int, int]]:
+        """
+        now_sec (営業日の秒) から見て、run 分以上先かつ horizon 分以内に出る便を
+        最大 limit 件、(インデックス, 残り分) のリストで返す
+        """
+        lo = -(-now_sec // 60) + run                 # 残り run 分以上 ⇔ 発車分 ≥ ceil(now) + run
+        hi = -(-(now_sec + horizon * 60) // 60)      # 残り horizon 分未満 ⇔ 発車分 < ceil(now + horizon)
+        out: list[tuple[int, int]] = []
+        mins = self.minutes
+        n = len(mins)
+        # 営業日末尾から翌営業日の始発へ跨る場合は 1 日ずらしてもう一度探す
+        for shift in (0, 1440):
+            i = bisect_left(mins, lo - shift)
+            while i < n and len(out) < limit and mins[i] < hi - shift:
+                out.append((i, ((mins[i] + shift) * 60 - now_sec) // 60))
+                i += 1
+            if len(out) >= limit or hi - shift <= 1440 + SERVICE_DAY_CUTOFF * 60:
+                break
+        return out
+
+
+EMPTY_TIMETABLE = Timetable(array("H"), (), ())
+
+
+class DepartureBatch:
+    """
+    表示対象の全方面の発車分を 1 本の配列に連結し、次の発車の選択を全方面まとめて行う。
+      key = 方面番号 × SPAN + 発車分 とすると連結した配列全体が昇順になるので、
+      各方面の「run 分後以降・horizon 分以内」の範囲は searchsorted 2 回で一度に求まる。
+      残り分・歩いて間に合うか (walk) も全方面分を配列演算で出す。
+    連結は時刻表が入れ替わった時だけ作り直す。NumPy が無ければ方面ごとに next_departures を呼ぶ。
+    """
+
+    SPAN = 1 << 12   # 営業日の分 (最大 1440 + SERVICE_DAY_CUTOFF × 60) より大きい
+
+    def __init__(self, tables: Sequence[Timetable], run: Sequence[int], limit: Sequence[int],
+                 walk: Sequence[int]) -> None:
+        self.tables = list(tables)
+        self.run, self.limit, self.walk = list(run), list(limit), list(walk)
+        self._labels: dict[tuple[int, int], str] = {}
+        if np is None:
+            return
+        n = len(self.tables)
+        sizes = np.fromiter((len(tt.minutes) for tt in self.tables), dtype=np.int64, count=n)
+        self._starts = np.zeros(n, dtype=np.int64)
+        np.cumsum(sizes[:-1], out=self._starts[1:])
+        self._seg = np.arange(n, dtype=np.int64) * self.SPAN
+        parts = [np.frombuffer(tt.minutes, dtype=np.uint16) if len(tt.minutes) else np.zeros(0, np.uint16)
+                 for tt in self.tables]
+        self._minutes = np.concatenate(parts).astype(np.int64) if parts else np.zeros(0, np.int64)
+        self._keys = self._minutes + np.repeat(self._seg, sizes)
+        self._run = np.asarray(self.run, dtype=np.int64)
+        self._limit = np.asarray(self.limit, dtype=np.int64)
+        self._walk = np.asarray(self.walk, dtype=np.int64)
+        self._width = int(self._limit.max()) if n else 0
+
+    def select(self, now_sec: int, horizon: int = 60) -> list[list[tuple[int, int, bool]]]:
+        """方面ごとに [(その時刻表でのインデックス, 残り分, 歩いて間に合うか), ...] (最大 limit 件)"""
+        if np is None:
+            return [[(i, m, m >= w) for i, m in tt.next_departures(now_sec, run, lim, horizon)]
+                    for tt, run, lim, w in zip(self.tables, self.run, self.limit, self.walk)]
+        n, w = len(self.tables), self._width
+        if n == 0 or len(self._keys) == 0:
+            return [[] for _ in range(n)]
+        lo = -(-now_sec // 60) + self._run
+        hi = -(-(now_sec + horizon * 60) // 60)
+        cols = np.arange(w)[None, :]
+        found = np.zeros(n, dtype=np.int64)
+        idx = np.full((n, w), -1, dtype=np.int64)
+        rem = np.zeros((n, w), dtype=np.int64)
+        # 営業日末尾から翌営業日の始発へ跨る場合は 1 日ずらしてもう一度探す (next_departures と同じ)
+        for shift in (0, 1440):
+            first = np.searchsorted(self._keys, self._seg + np.clip(lo - shift, 0, self.SPAN - 1))
+            last = np.searchsorted(self._keys, self._seg + min(max(hi - shift, 0), self.SPAN - 1))
+            count = np.clip(np.minimum(last - first, self._limit - found), 0, None)
+            pos = cols - found[:, None]                        # この回で見つけた便の中での順番
+            ok = (pos >= 0) & (pos < count[:, None])
+            at = np.clip(first[:, None] + pos, 0, len(self._keys) - 1)
+            idx = np.where(ok, at, idx)
+            rem = np.where(ok, ((self._minutes[at] + shift) * 60 - now_sec) // 60, rem)
+            found += count
+            if hi - shift <= 1440 + SERVICE_DAY_CUTOFF * 60:
+                break
+        local = (idx - self._starts[:, None]).tolist()
+        walkable = (rem >= self._walk[:, None]).tolist()
+        rem = rem.tolist()
+        return [list(zip(local[k][:c], rem[k][:c], walkable[k][:c])) for k, c in enumerate(found.tolist())]
+
+    def label(self, k: int, i: int) -> str:
+        """方面 k の i 番目の便の表示 ("08:15発 【急行】 渋谷行")。一度作った文字列は使い回す"""
+        s = self._labels.get((k, i))
+        if s is None:
+            tt = self.tables[k]
+            display_parts = [f"{fmt_minutes(tt.minutes[i])}発"]
+            train_type, destination = tt.types[i], tt.dests[i]
+            if train_type and train_type not in ["-", "ー"]:
+                display_parts.append(f"【{train_type}】")
+            if destination and destination not in ["-", "ー"]:
+                display_parts.append(f"{destination}行")
+            s = self._labels[(k, i)] = " ".join(display_parts)
+        return s
+
+
+class _StrColumn(Sequence):
+    """文字列表へのインデックス配列を、文字列の列として見せる (スナップショット用)"""
+    __slots__ = ("_idx", "_strs")
+
+    def __init__(self, idx: memoryview, strs: list[str]) -> None:
+        self._idx, self._strs = idx, strs
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._strs[j] for j in self._idx[i]]
+        return self._strs[self._idx[i]]
+
+    def __len__(self) -> int:
+        return len(self._idx)
+
+
+class TimetableSnapshot:
+    """
+    パース済み時刻表をまとめたバイナリファイル (timetable_data/timetables.snap)。
+    mmap で読むので、複数ワーカーで開いてもページキャッシュを共有し、起動時のパースも不要。
+
+    レイアウト (すべてリトルエンディアン。配列は mmap 上をそのまま cast するので、読めるのはリトルエンディアンの機械だけ):
+      ヘッダ   : magic(8) 解析規則の版(I) 営業日の区切り(I) 表の数(I) 文字列数(I)
+                 文字列表の位置(Q) 索引の位置(Q) データの位置(Q)
+      文字列表 : 終端オフセット I[文字列数] + UTF-8 連結 (種別・行き先・キーを重複なしで格納)
+      索引     : (キー文字列番号 I, 元ファイル mtime_ns q, 開始位置 I, 本数 I) × 表の数
+      データ   : 発車分 H[全本数] + 種別番号 H[全本数] + 行き先番号 H[全本数]
+    magic (ファイル形式の版)・解析規則の版・SERVICE_DAY_CUTOFF のどれかが今と違えば読まない (全部パースし直す)
+    """
+
+    MAGIC = b"TTSNAP2\0"
+    RULES = 1   # 読み込み関数・Timetable.from_rows の解釈を変えたら上げる
+    _HEAD = struct.Struct("<8sIIIIQQQ")
+    _INDEX = struct.Struct("<IqII")
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.tables: dict[str, tuple[int, Timetable]] = {}
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mv = memoryview(self._mm)
+        magic, rules, cutoff, n_tables, n_strings, str_off, idx_off, data_off = self._HEAD.unpack_from(mv, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"not a timetable snapshot (or an older format): {path}")
+        if rules != self.RULES or cutoff != SERVICE_DAY_CUTOFF:
+            raise ValueError(f"stale snapshot (rules {rules}, cutoff {cutoff}): {path}")
+        if sys.byteorder != "little":
+            raise ValueError("timetable snapshots need a little-endian host")
+
+        ends = mv[str_off:str_off + 4 * n_strings].cast("I")
+        blob_off = str_off + 4 * n_strings
+        strs, prev = [], 0
+        for end in ends:
+            strs.append(sys.intern(bytes(mv[blob_off + prev:blob_off + end]).decode("utf-8")))
+            prev = end
+
+        index = [self._INDEX.unpack_from(mv, idx_off + i * self._INDEX.size) for i in range(n_tables)]
+        total = max((start + count for _, _, start, count in index), default=0)
+        minutes = mv[data_off:data_off + 2 * total].cast("H")
+        types = mv[data_off + 2 * total:data_off + 4 * total].cast("H")
+        dests = mv[data_off + 4 * total:data_off + 6 * total].cast("H")
+        for key_i, mtime, start, count in index:
+            end = start + count
+            self.tables[strs[key_i]] = (mtime, Timetable(minutes[start:end],
+                                                         _StrColumn(types[start:end], strs),
+                                                         _StrColumn(dests[start:end], strs)))
+
+    def lookup(self, key: str, mtime: int) -> Timetable | None:
+        """元ファイルの mtime が作成時と同じ時だけ返す (更新されていたら None ➜ 再パース)"""
+        hit = self.tables.get(key)
+        return hit[1] if hit is not None and hit[0] == mtime else None
+
+    @classmethod
+    def write(cls, path: Path, tables: dict[str, tuple[int, Timetable]]) -> None:
+        """tables (キー ➜ (mtime_ns, Timetable)) をスナップショットとして書き出す (一時ファイル ➜ rename)"""
+        strings: dict[str, int] = {}
+        intern_ = lambda x: strings.setdefault(x, len(strings))
+        index, minutes, types, dests = [], array("H"), array("H"), array("H")
+        for key, (mtime, tt) in tables.items():
+            index.append((intern_(key), mtime, len(minutes), len(tt.minutes)))
+            minutes.extend(tt.minutes)
+            types.extend(intern_(x) for x in tt.types)
+            dests.extend(intern_(x) for x in tt.dests)
+
+        blobs = [x.encode("utf-8") for x in strings]
+        ends = array("I", accumulate(len(b) for b in blobs))
+        str_off = cls._HEAD.size
+        idx_off = str_off + 4 * len(blobs) + (ends[-1] if ends else 0)
+        idx_off += -idx_off % 8
+        data_off = idx_off + cls._INDEX.size * len(index)
+        data_off += -data_off % 8
+
+        if sys.byteorder != "little":
+            for arr in (ends, minutes, types, dests):
+                arr.byteswap()
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(cls._HEAD.pack(cls.MAGIC, cls.RULES, SERVICE_DAY_CUTOFF, len(index), len(blobs),
+                                   str_off, idx_off, data_off))
+            f.write(ends.tobytes())
+            f.write(b"".join(blobs))
+            f.write(b"\0" * (idx_off - f.tell()))
+            for ent in index:
+                f.write(cls._INDEX.pack(*ent))
+            f.write(b"\0" * (data_off - f.tell()))
+            f.write(minutes.tobytes() + types.tobytes() + dests.tobytes())
+        os.replace(tmp, path)
+
+
+class TimetableStore:
+    """
+    timetable_data/ 配下のファイルをパース済みの Timetable としてメモリに保持する。
+    キーごとに読み込み時の mtime を覚えておき、ファイルが更新された時だけ再パースする。
+    スナップショットがあれば、mtime が一致する表はパースせずにそこから (mmap で) 取り出す。
+    watched (TimetableWatcher が監視中) の間は mtime を見に行かず、読み直しは reload() に任せる。
+    """
+
+    def __init__(self, snapshot_path: Path | None = None) -> None:
+        self._entries: dict[str, tuple[int | None, Timetable]] = {}
+        self._lock = threading.Lock()
+        self.snapshot_path = snapshot_path
+        self._snapshot: TimetableSnapshot | None = None
+        self.parsed = 0   # スナップショットに無く、ファイルからパースした回数
+        self.watched = False
+
+    def open_snapshot(self) -> None:
+        if self.snapshot_path is None or not self.snapshot_path.exists():
+            return
+        try:
+            self._snapshot = TimetableSnapshot(self.snapshot_path)
+        except Exception as e:
+            LOG.warn(f"snapshot load error: {self.snapshot_path} - {e}")
+
+    def get(self, key: str, path: Path, loader: Callable[[Path], list], kind: str = "") -> Timetable:
+        """kind はメトリクスのラベル (train_csv / bus_csv / bus_excel)"""
+        if self.watched and (hit := self._entries.get(key)) is not None:
+            METRICS.inc("store_lookups_total", result="memory")
+            return hit[1]
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        hit = self._entries.get(key)
+        if hit is not None and hit[0] == mtime:
+            METRICS.inc("store_lookups_total", result="memory")
+            return hit[1]
+
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] == mtime:
+                METRICS.inc("store_lookups_total", result="memory")
+                return hit[1]
+            if mtime is None:
+                LOG.warn(f"timetable not found: {path}")
+                METRICS.inc("store_lookups_total", result="missing")
+                tt = EMPTY_TIMETABLE
+            elif self._snapshot is not None and (tt := self._snapshot.lookup(key, mtime)) is not None:
+                METRICS.inc("store_lookups_total", result="snapshot")
+            else:
+                try:
+                    with METRICS.timer("store_load_seconds", loader=kind):
+                        tt = Timetable.from_rows(loader(path))
+                    self.parsed += 1
+                    METRICS.inc("store_lookups_total", result="parsed")
+                except Exception as e:
+                    LOG.error(f"timetable load error: {path} - {e}")
+                    METRICS.inc("store_load_errors_total", loader=kind)
+                    tt = EMPTY_TIMETABLE
+            self._entries[key] = (mtime, tt)
+            return tt
+
+    def reload(self, key: str, path: Path, loader: Callable[[Path], list], kind: str = "") -> str:
+        """
+        1 つの表を読み直して差し替える。結果 ok / removed / invalid / unchanged を返す。
+        読めない・発車が 1 本も無くなった表は差し替えず (前の表を使い続け)、エラーとして報告する
+        """
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            LOG.warn(f"timetable removed: {path}")
+            self._entries[key] = (None, EMPTY_TIMETABLE)
+            return "removed"
+        old = self._entries.get(key)
+        if old is not None and old[0] == mtime:
+            return "unchanged"
+        try:
+            with METRICS.timer("store_load_seconds", loader=kind):
+                tt = Timetable.from_rows(loader(path))
+        except Exception as e:
+            LOG.error(f"timetable reload rejected: {path} - {e}")
+            return "invalid"
+        if not tt.minutes and old is not None and old[1].minutes:
+            LOG.error(f"timetable reload rejected: {path} - no departures (was {len(old[1].minutes)})")
+            return "invalid"
+        self.parsed += 1
+        self._entries[key] = (mtime, tt)   # 差し替えは dict の代入 1 回 (読み手は前後どちらかの表を見る)
+        return "ok"
+
+    def adopt(self, key: str, path: Path) -> str:
+        """
+        reload() のパースしない版 (監視のリーダーでないワーカー用)。リーダーが書き直したスナップショットに
+        今の mtime の表があればそれに差し替える。結果 ok / removed / unchanged / pending (スナップショットに
+        まだ無い・リーダーが採用しなかった。前の表を使い続ける) を返す
+        """
+        old = self._entries.get(key)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            if old is not None and old[0] is None:
+                return "unchanged"
+            self._entries[key] = (None, EMPTY_TIMETABLE)
+            return "removed"
+        if old is not None and old[0] == mtime:
+            return "unchanged"
+        tt = self._snapshot.lookup(key, mtime) if self._snapshot is not None else None
+        if tt is None:
+            return "pending"
+        self._entries[key] = (mtime, tt)
+        return "ok"
+
+    def write_snapshot(self) -> None:
+        """読み込み済みの表 (ファイルが存在するもの) をスナップショットに書き出す"""
+        tables = {k: v for k, v in self._entries.items() if v[0] is not None}
+        TimetableSnapshot.write(self.snapshot_path, tables)
+        LOG.info(f"timetable snapshot written: {self.snapshot_path} ({len(tables)} tables)")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+TIMETABLES = TimetableStore(DATA_DIR / "timetables.snap")
 
 
 # ──────────────────────────────────────────
 #  発車案内ルート定義
 # ──────────────────────────────────────────
+# stop  : 乗り場 (経路検索で使う停留所名。同じ名前の路線同士は乗り換えできる)
+# stops : 方面ごとの (降車停留所, 乗車からの所要分)。所要分は目安なので実際に合わせて調整する
 ROUTES = [
     dict(
+        id="OM",
+        stop="尾山台",
         label="東急大井町線　尾山台駅",
         type="train",
         line_code="OM",
         directions=[
-            dict(column="大井町方面", dest_tag="Ooimachi"),
-            dict(column="溝の口方面", dest_tag="Mizonokuchi"),
+            dict(column="大井町方面", dest_tag="Ooimachi",
+                 stops=[("九品仏", 1), ("自由が丘", 3), ("大岡山", 7), ("旗の台", 10), ("大井町", 17)]),
+            dict(column="溝の口方面", dest_tag="Mizonokuchi",
+                 stops=[("等々力", 1), ("上野毛", 3), ("二子玉川", 5), ("溝の口", 10)]),
         ],
         max=3,
         walk=14,
         run=10,
     ),
     dict(
+        id="TY",
+        stop="田園調布",
         label="東急東横線　田園調布駅", # ラベル変更
         type="train",
         line_code="TY",
         directions=[
-            dict(column="渋谷方面", dest_tag="Shibuya"),
-            dict(column="横浜方面", dest_tag="Yokohama"),
+            dict(column="渋谷方面", dest_tag="Shibuya",
+                 stops=[("自由が丘", 2), ("学芸大学", 6), ("中目黒", 9), ("渋谷", 13)]),
+            dict(column="横浜方面", dest_tag="Yokohama",
+                 stops=[("多摩川", 2), ("武蔵小杉", 5), ("日吉", 10), ("菊名", 14), ("横浜", 23)]),
         ],
         max=3,
         walk=30, # 所要時間変更
         run=25,  # 所要時間変更
     ),
     dict(
+        id="MG",
+        stop="田園調布",
         label="東急目黒線　田園調布駅", # ラベル変更
         type="train",
         line_code="MG",
         directions=[
-            dict(column="目黒方面", dest_tag="Meguro"),
-            dict(column="日吉方面", dest_tag="Hiyoshi"),
+            dict(column="目黒方面", dest_tag="Meguro",
+                 stops=[("奥沢", 2), ("大岡山", 4), ("目黒", 13)]),
+            dict(column="日吉方面", dest_tag="Hiyoshi",
+                 stops=[("多摩川", 2), ("武蔵小杉", 5), ("日吉", 10)]),
         ],
         max=3,
         walk=30, # 所要時間変更
@@ -316,12 +792,16 @@ ROUTES = [
     ),
     # --- ここから追加 ---
     dict(
+        id="BL",
+        stop="中川",
         label="横浜市営地下鉄ブルーライン 中川駅",
         type="train",
         line_code="BL", # ブルーラインの路線コード (仮)
         directions=[
-            dict(column="あざみ野方面", dest_tag="Azamino"),
-            dict(column="湘南台方面", dest_tag="Shonandai"),
+            dict(column="あざみ野方面", dest_tag="Azamino",
+                 stops=[("あざみ野", 2)]),
+            dict(column="湘南台方面", dest_tag="Shonandai",
+                 stops=[("センター北", 2), ("センター南", 4), ("新横浜", 16), ("横浜", 27), ("湘南台", 52)]),
         ],
         max=3, # 表示件数 (他に合わせて3件)
         walk=15,
@@ -329,35 +809,41 @@ ROUTES = [
     ),
     # --- ここまで追加 ---
     dict(
+        id="tama11",
+        stop="東京都市大学南入口",
         label="玉11　東京都市大学南入口",
         type="bus",
         file=bus_timetable_file,
         directions=[
-            dict(column="多摩川駅方面", sheet_direction="多摩川"),
-            dict(column="二子玉川駅方面", sheet_direction="二子玉川"),
+            dict(column="多摩川駅方面", sheet_direction="多摩川", stops=[("多摩川", 12)]),
+            dict(column="二子玉川駅方面", sheet_direction="二子玉川", stops=[("二子玉川", 15)]),
         ],
         max=2,
         walk=7,
         run=5,
     ),
     dict(
+        id="en02",
+        stop="東京都市大学北入口",
         label="園02　東京都市大学北入口",
         type="bus_3",
         file=bus_timetable_file3,
         directions=[
-            dict(column="千歳船橋駅方面", sheet_direction="千歳船橋"),
-            dict(column="田園調布方面", sheet_direction="田園調布"),
+            dict(column="千歳船橋駅方面", sheet_direction="千歳船橋", stops=[("千歳船橋", 20)]),
+            dict(column="田園調布方面", sheet_direction="田園調布", stops=[("田園調布", 10)]),
         ],
         max=2,
         walk=7,
         run=5,
     ),
     dict(
+        id="todo01",
+        stop="東京都市大学前",
         label="等01　東京都市大学前",
         type="bus_2",
         file=bus_timetable_file2,
         directions=[
-            dict(column="等々力循環", sheet_direction="等々力"),
+            dict(column="等々力循環", sheet_direction="等々力", stops=[("等々力", 8)]),
         ],
         max=2,
         walk=7,
@@ -365,11 +851,13 @@ ROUTES = [
     ),
     # --- ここから追加 ---
     dict(
+        id="chotokuji",
+        stop="長徳寺前",
         label="東急バス　長徳寺前",
         type="bus_csv",
         directions=[
-            dict(column="鷺沼駅方面", dest_tag="Saginuma"),
-            dict(column="センター北駅方面", dest_tag="CenterKita"),
+            dict(column="鷺沼駅方面", dest_tag="Saginuma", stops=[("鷺沼", 10)]),
+            dict(column="センター北駅方面", dest_tag="CenterKita", stops=[("センター北", 15)]),
         ],
         max=3,
         walk=10,
@@ -378,73 +866,931 @@ ROUTES = [
     # --- ここまで追加 ---
 ]
 
+# 表示ボード (名前 ➜ 表示する路線 ID)。"路線ID.方面タグ" で方面だけを指定することもできる
+BOARDS: dict[str, list[str] | None] = {
+    "all":   None,                                   # 全路線
+    "train": ["OM", "TY", "MG", "BL"],
+    "bus":   ["tama11", "en02", "todo01", "chotokuji"],
+}
+# /page/<p> ➜ そのページで使うボード名 (未登録のページは "all")
+PAGE_BOARDS: dict[int, str] = {1: "all"}
+
+Scope = tuple[tuple[int, tuple[int, ...]], ...]   # ((ROUTES の添字, (方面の添字, ...)), ...)
+
+
+def direction_tag(d: dict) -> str:
+    return d.get("dest_tag") or d.get("sheet_direction") or d["column"]
+
+
+def resolve_scope(routes: str | None = None, board: str | None = None,
+                  page: int | None = None, site: str | None = None) -> Scope | None:
+    """
+    表示対象を ROUTES の添字に解決する。None は全路線。
+      routes : "OM,TY.Shibuya,tama11" (路線 ID または 路線ID.方面タグ のカンマ区切り)
+      board  : サイトのボード名 (既定サイトは BOARDS)
+      page   : ページ番号 (サイトの pages / PAGE_BOARDS でボード名に変換)
+      site   : サイト名 (SITES。省略時は既定サイト)。路線 ID はそのサイトの路線から探す
+    不明な指定は ValueError
+    """
+    st = SITES.get(site or DEFAULT_SITE)
+    if st is None:
+        raise ValueError(f"unknown site: {site}")
+    members = [i for i, r in enumerate(ROUTES) if r.get("site", DEFAULT_SITE) == st.name]
+    if routes:
+        spec = [x.strip() for x in routes.split(",") if x.strip()]
+    else:
+        name = board or st.pages.get(page or 1, "all")
+        if name not in st.boards:
+            raise ValueError(f"unknown board: {name}")
+        spec = st.boards[name]
+    if spec is None:
+        if len(members) == len(ROUTES):
+            return None   # サイトが 1 つだけなら「全路線」のまま (キャッシュ・配信を全サイトで共有)
+        spec = [ROUTES[i]["id"] for i in members]
+
+    ids = {ROUTES[i]["id"]: i for i in members}
+    picked: dict[int, set[int]] = {}
+    for item in spec:
+        rid, _, tag = item.partition(".")
+        if rid not in ids:
+            raise ValueError(f"unknown route: {rid}")
+        ri = ids[rid]
+        dirs = ROUTES[ri].get("directions", [])
+        if tag:
+            hit = [di for di, d in enumerate(dirs) if direction_tag(d) == tag]
+            if not hit:
+                raise ValueError(f"unknown direction: {item}")
+        else:
+            hit = range(len(dirs))
+        picked.setdefault(ri, set()).update(hit)
+    return tuple((ri, tuple(sorted(dis))) for ri, dis in sorted(picked.items()))
+
+
+def scope_from_request() -> Scope | None:
+    return resolve_scope(request.args.get("routes"), request.args.get("board"),
+                         request.args.get("page", type=int), request.args.get("site"))
+
+
+class TimetableSource(NamedTuple):
+    key: str                          # ストアのキー (ファイル名 / "ファイル名#シート名#列名")
+    path: Path
+    loader: Callable[[Path], list]
+    kind: str                         # train_csv / bus_csv / bus_excel (メトリクスのラベル)
+
+
+def timetable_source(r: dict, d: dict, day: str) -> TimetableSource:
+    """ROUTES の 1 方面 × ダイヤ種別 ➜ 読み込むファイル (とシート)"""
+    if r["type"] == "train":
+        # ─── 電車 (CSV)
+        path = train_csv_path(r["line_code"], d["dest_tag"], day)
+        return TimetableSource(path.name, path, read_train_csv, "train_csv")
+    if r["type"] == "bus_csv":
+        # ─── バス (CSVバージョン)
+        path = bus_csv_path(d["dest_tag"], day)
+        return TimetableSource(path.name, path, read_bus_csv, "bus_csv")
+    # ─── バス (Excel)
+    sh, col = sheet_name(r["type"], d.get("sheet_direction"), day), d["column"]
+    # 同じシートでも読む列が違えば別の表 (列名もキーに含める)
+    return TimetableSource(f"{r['file'].name}#{sh}#{col}", r["file"], lambda p: fetch_bus_schedule(sh, col, p),
+                           "bus_excel")
+
+
+# ──────────────────────────────────────────
+#  サイト (1 つのサーバーで複数の場所の案内板を受け持つ)
+# ──────────────────────────────────────────
+SITES_DIR = BASE_DIR / "sites"   # サイト定義 (<サイト名>.json。書き方は sites/yokohama.json.example)
+DEFAULT_SITE = "main"            # 上の ROUTES / BOARDS / PAGE_BOARDS (サイト指定なし)
+DEFAULT_SITE_LABEL = "東京都市大学"   # /api/sites に出す既定サイトの表示名
+
+
+class SiteConfigError(ValueError):
+    """sites/<サイト名>.json の誤り。どのファイルのどの項目かをメッセージに含め、起動を止める"""
+
+
+class Site(NamedTuple):
+    name: str
+    label: str
+    boards: dict[str, list[str] | None]   # ボード名 ➜ 路線 ID ("all" は全路線)
+    pages: dict[int, str]                 # /page/<p> ➜ ボード名
+
+
+def _site_route(spec: object, base: dict[str, dict], name: str) -> dict:
+    """サイト定義の routes の 1 要素 ➜ ROUTES の 1 要素 (不正なら SiteConfigError)"""
+    if not isinstance(spec, dict):
+        raise SiteConfigError(f"routes: each route must be an object, got {spec!r}")
+    spec = dict(spec)
+    ref = spec.pop("ref", None)
+    if ref is not None and ref not in base:
+        raise SiteConfigError(f"routes: unknown ref {ref!r} (known: {', '.join(base)})")
+    r = {**base[ref], **spec} if ref is not None else spec
+    rid = r.get("id", ref or "?")
+    missing = {"id", "label", "type", "directions", "max", "walk", "run"} - r.keys()
+    if missing:
+        raise SiteConfigError(f"route {rid}: missing {', '.join(sorted(missing))}")
+    for key in ("max", "walk", "run"):
+        if not isinstance(r[key], int) or r[key] < 0:
+            raise SiteConfigError(f"route {rid}: {key} must be a non-negative integer, got {r[key]!r}")
+    if not isinstance(r["directions"], list) or not r["directions"]:
+        raise SiteConfigError(f"route {rid}: directions must be a non-empty list")
+    if isinstance(r.get("file"), str):
+        r["file"] = DATA_DIR / r["file"]   # Excel は timetable_data/ からの相対パス
+    r["site"] = name
+    for d in r["directions"]:
+        if not isinstance(d, dict) or not isinstance(d.get("column"), str):
+            raise SiteConfigError(f"route {rid}: each direction must be an object with a column")
+        for day in DAY_TYPES:
+            try:
+                timetable_source(r, d, day)
+            except KeyError as e:
+                raise SiteConfigError(f"route {rid}, direction {d['column']}: missing {e.args[0]!r}") from None
+            except ValueError:
+                raise SiteConfigError(f"route {rid}: unknown type {r['type']!r}") from None
+    return r
+
+
+def _site(conf: object, base: dict[str, dict], name: str) -> tuple[Site, list[dict]]:
+    """サイト定義 1 つ ➜ (Site, そのサイトの路線)。不正なら SiteConfigError"""
+    if not isinstance(conf, dict):
+        raise SiteConfigError("top level must be an object")
+    unknown = conf.keys() - {"label", "routes", "boards", "pages"}
+    if unknown:
+        raise SiteConfigError(f"unknown keys: {', '.join(sorted(unknown))}")
+    label = conf.get("label", name)
+    if not isinstance(label, str):
+        raise SiteConfigError("label must be a string")
+    if not isinstance(conf.get("routes"), list) or not conf["routes"]:
+        raise SiteConfigError("routes must be a non-empty list")
+    routes = [_site_route(spec, base, name) for spec in conf["routes"]]
+    ids = [r["id"] for r in routes]
+    if len(set(ids)) != len(ids):
+        raise SiteConfigError(f"routes: duplicate id {next(i for i in ids if ids.count(i) > 1)!r}")
+    boards = conf.get("boards", {})
+    if not isinstance(boards, dict):
+        raise SiteConfigError("boards must be an object (board name -> list of route ids)")
+    for board, members in boards.items():
+        if members is not None and (not isinstance(members, list) or not set(members) <= set(ids)):
+            raise SiteConfigError(f"boards.{board}: must be null or a list of this site's route ids ({', '.join(ids)})")
+    boards = {"all": None, **boards}
+    pages = conf.get("pages", {})
+    if not isinstance(pages, dict):
+        raise SiteConfigError("pages must be an object (page number -> board name)")
+    for k, board in pages.items():
+        if not str(k).isdigit() or board not in boards:
+            raise SiteConfigError(f"pages.{k}: must map a page number to a board ({', '.join(boards)})")
+    return Site(name, label, boards, {int(k): v for k, v in pages.items()}), routes
+
+
+def load_sites(directory: Path) -> dict[str, Site]:
+    """
+    directory/<サイト名>.json を読み、各サイトの路線を ROUTES の末尾に足す (route["site"] = サイト名)。
+      {"label": "横浜キャンパス",
+       "routes": [{"ref": "BL", "walk": 8, "run": 5},     … 既定サイトの路線を、所要分などだけ変えて使う
+                  {"id": "...", "label": "...", "type": "bus_csv", "directions": [...], …}],   … ROUTES と同じ形
+       "boards": {"train": ["BL"]}, "pages": {"2": "train"}}
+    Excel の file は timetable_data/ からの相対パス。同じ時刻表ファイルを指す路線は、サイトが違っても
+    ストア上は 1 つの表を共有する。読めない・形式が不正なファイルがあれば SiteConfigError で起動を止める
+    """
+    sites = {DEFAULT_SITE: Site(DEFAULT_SITE, DEFAULT_SITE_LABEL, BOARDS, PAGE_BOARDS)}
+    base = {r["id"]: r for r in ROUTES if r.get("site", DEFAULT_SITE) == DEFAULT_SITE}
+    for path in sorted(directory.glob("*.json")) if directory.is_dir() else ():
+        name = path.stem
+        if name in sites:
+            raise SiteConfigError(f"{path}: site name {name!r} is reserved for the default site")
+        try:
+            conf = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise SiteConfigError(f"{path}: cannot read as JSON - {e}") from None
+        try:
+            sites[name], routes = _site(conf, base, name)
+        except SiteConfigError as e:
+            raise SiteConfigError(f"{path}: {e}") from None
+        ROUTES.extend(routes)
+    return sites
+
+
+SITES = load_sites(SITES_DIR)
+
+
+def timetable_sources(routes: list[dict]) -> dict[tuple[str, str, str, str], TimetableSource]:
+    """(サイト, 路線 ID, 方面の列名, ダイヤ種別) ➜ 読み込み元。ファイル名・シート名の組み立ては起動時の 1 回だけ"""
+    return {(r.get("site", DEFAULT_SITE), r["id"], d["column"], day): timetable_source(r, d, day)
+            for r in routes for d in r.get("directions", []) for day in DAY_TYPES}
+
+
+TIMETABLE_SOURCES = timetable_sources(ROUTES)
+
+
+def route_timetable(r: dict, d: dict, day: str) -> Timetable:
+    """ROUTES の 1 方面について、ダイヤ種別 day の時刻表をストアから取得する"""
+    src = TIMETABLE_SOURCES[(r.get("site", DEFAULT_SITE), r["id"], d["column"], day)]
+    return TIMETABLES.get(src.key, src.path, src.loader, src.kind)
+
+
+def preload_timetables(write_snapshot: bool = True) -> None:
+    """
+    全サイトの時刻表を起動時に読み込んでおく。同じファイル (とシート) は 1 回だけ読む。
+    スナップショットが無い・古い (パースが発生した) 場合は書き直して、次回以降の起動や
+    他のワーカーがそれを mmap できるようにする
+    """
+    TIMETABLES.open_snapshot()
+    distinct = {src.key: src for src in TIMETABLE_SOURCES.values()}
+    for src in distinct.values():
+        TIMETABLES.get(src.key, src.path, src.loader, src.kind)
+    LOG.info(f"timetables: {len(distinct)} distinct for {len(TIMETABLE_SOURCES)} references "
+             f"({len(SITES)} sites, {len(ROUTES)} routes)")
+    if write_snapshot and TIMETABLES.parsed:
+        TIMETABLES.write_snapshot()
+
+
+class TimetableWatcher:
+    """
+    timetable_data/ を監視し (fswatch.DirWatcher)、追加・更新・削除されたファイルを使う
+    (路線, 方面, ダイヤ種別) の表だけをこのスレッドで読み直して差し替える。
+      ・変化を見つけたら settle 秒待って、続けて書かれたファイルもまとめて処理する
+      ・差し替えた後は連結済みの発車表・経路検索の索引・応答キャッシュを捨てる
+    複数ワーカーでは、SHARED の "timetables" ロックを取れたワーカー (リーダー) だけがパースして
+    スナップショットを書き直す。他のワーカーはスナップショットが書き換わったら開き直し、
+    mtime が一致する表をそこから差し替える (パースも書き込みもしない)。
+    リーダーが終わればロックは次に確かめたワーカーに移り、そのワーカーは全部の表を確かめ直す。
+    リクエスト側がパースすることはない。監視を始めるとストアは mtime の確認もやめる。
+    """
+
+    def __init__(self, directory: Path, settle: float = 0.5) -> None:
+        self.directory = directory
+        self.settle = settle
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="timetable-watch", daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def is_leader() -> bool:
+        return SHARED is None or SHARED.try_lead("timetables")
+
+    def _run(self) -> None:
+        watcher = DirWatcher(self.directory)
+        TIMETABLES.watched = True
+        leader = self.is_leader()
+        LOG.info(f"watching {self.directory} ({watcher.kind}, {'leader' if leader else 'follower'})")
+        while True:
+            try:
+                names = watcher.wait(60)
+                if not leader and self.is_leader():
+                    leader = True
+                    LOG.info("timetable watcher: took over as leader")
+                    names |= {src.path.name for src in TIMETABLE_SOURCES.values()}   # 取りこぼしが無いよう全部
+                if names:
+                    time.sleep(self.settle)
+                    self.apply(names | watcher.wait(0), leader)
+            except Exception as e:
+                LOG.error(f"timetable watcher error: {e}", key="timetable-watch")
+                time.sleep(5)
+
+    def apply(self, names: set[str], leader: bool = True) -> int:
+        """
+        ファイル名の集合 ➜ 影響する表を差し替え、差し替えた数を返す。
+        leader なら読み直してスナップショットを書き直す。そうでなければスナップショットから取り出すだけ
+        """
+        snap = TIMETABLES.snapshot_path
+        if not leader and snap is not None and snap.name in names:
+            TIMETABLES.open_snapshot()
+            names = names | {src.path.name for src in TIMETABLE_SOURCES.values()}
+        sources = {src.key: src for src in TIMETABLE_SOURCES.values() if src.path.name in names}
+        swapped = 0
+        for src in sources.values():
+            if leader:
+                result = TIMETABLES.reload(src.key, src.path, src.loader, src.kind)
+            else:
+                result = TIMETABLES.adopt(src.key, src.path)
+            METRICS.inc("timetable_reload_total", result=result)
+            if result in ("ok", "removed"):
+                LOG.info(f"timetable reloaded: {src.key} ({result})")
+                swapped += 1
+        if swapped:
+            clear_batches()
+            SCHEDULE_CACHE.clear()
+            DAY_SCHEDULE_CACHE.clear()
+            if leader and snap is not None:
+                TIMETABLES.write_snapshot()
+        return swapped
+
+
+WATCHER = TimetableWatcher(DATA_DIR)
+
+
+# ──────────────────────────────────────────
+#  レスポンスキャッシュ (全クライアント共通、直列化済みバイト列 + ETag)
+# ──────────────────────────────────────────
+GZIP_MIN_BYTES = 512   # これより小さい応答は圧縮しない (ヘッダの方が大きくなる)
+
+
+class ResponseCache:
+    """
+    キー ➜ (JSON バイト列, ETag, gzip 済みバイト列 or None) を保持する。同じキーの間は 1 回だけ
+    組み立て・直列化・圧縮し、以降は同じバイト列を返す。キーが変わった古いエントリは max_entries を超えた分から捨てる。
+    """
+
+    def __init__(self, name: str, max_entries: int = 64) -> None:
+        self.name = name   # メトリクスのラベル
+        self._entries: dict[tuple, tuple[bytes, str, bytes | None]] = {}
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+
+    def get(self, key: tuple, build: Callable[[], object]) -> tuple[bytes, str, bytes | None]:
+        hit = self._entries.get(key)
+        if hit is not None:
+            METRICS.inc("response_cache_total", cache=self.name, result="hit")
+            return hit
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                METRICS.inc("response_cache_total", cache=self.name, result="hit")
+                return hit
+            METRICS.inc("response_cache_total", cache=self.name, result="miss")
+            body = app.json.dumps(build()).encode("utf-8")
+            gz = gzip.compress(body, 6, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+            hit = (body, hashlib.sha1(body).hexdigest()[:16], gz)
+            while len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = hit
+            return hit
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_json(cache: ResponseCache, key: tuple, build: Callable[[], object]) -> Response:
+    """キャッシュ済み JSON を返す (Accept-Encoding が gzip なら圧縮済みの版)。If-None-Match が一致すれば 304"""
+    body, etag, gz = cache.get(key, build)
+    if gz is not None and request.accept_encodings["gzip"]:
+        resp = Response(gz, mimetype="application/json")
+        resp.headers["Content-Encoding"] = "gzip"
+        etag += "-gz"   # 表現 (符号化) ごとに別の ETag
+    else:
+        resp = Response(body, mimetype="application/json")
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(etag)
+    resp.cache_control.no_cache = True   # ブラウザは毎回 If-None-Match で再検証する
+    return resp.make_conditional(request)
+
+
+SCHEDULE_CACHE = ResponseCache("schedule")
+
+
 # ──────────────────────────────────────────
 #  API: 発車案内
 # ──────────────────────────────────────────
-@app.route("/api/schedule")
-def api_schedule():
-    labs = ["先発", "次発", "次々発"]
-    res = {"current_time": datetime.now().strftime("%H:%M:%S"), "routes": []}
+def build_schedule(now: datetime, scope: Scope | None = None) -> dict:
+    """発車案内 JSON を組み立てる (now 時点)。scope を渡すとその路線・方面だけを計算する"""
+    with METRICS.timer("schedule_build_seconds"):
+        return _build_schedule(now, scope)
+
+
+BATCH_RECHECK = 5.0   # 連結済みの時刻表が最新かどうか (ファイルの mtime) を確かめる間隔 (秒)
+MAX_BATCHES = 64      # _BATCHES に残す (曜日種別, scope) の数。超えたら最も長く使われていないものから捨てる
+# (曜日種別, scope) ➜ (確認した時刻, 時刻表の id, 連結済み)。古い順 (最後に使われたものが末尾)
+_BATCHES: dict[tuple, tuple[float, tuple[int, ...], DepartureBatch]] = {}
+_BATCH_LOCK = threading.Lock()   # _BATCHES・_CONNECTIONS の読み書き (リクエストのスレッド間で共有)
+
 
-    for r in ROUTES:
+def _lru_get(cache: dict, key: tuple) -> tuple | None:
+    """cache[key] を返し、使われた印に末尾へ移す (_BATCH_LOCK の中で呼ぶ)"""
+    hit = cache.pop(key, None)
+    if hit is not None:
+        cache[key] = hit
+    return hit
+
+
+def _lru_put(cache: dict, key: tuple, value: tuple, limit: int) -> None:
+    """cache[key] = value。limit 個を超える分は最も長く使われていないものから捨てる (_BATCH_LOCK の中で呼ぶ)"""
+    cache.pop(key, None)
+    while len(cache) >= limit:
+        cache.pop(next(iter(cache)), None)
+    cache[key] = value
+
+
+def clear_batches() -> None:
+    """連結済みの発車表と経路検索の索引を捨てる (時刻表を読み直した時)"""
+    with _BATCH_LOCK:
+        _BATCHES.clear()
+        _CONNECTIONS.clear()
+
+
+def departure_batch(day: str, scope: Scope) -> DepartureBatch:
+    """
+    scope の全方面の DepartureBatch。BATCH_RECHECK 秒ごとに時刻表ストアを引き直し、
+    どれかの時刻表が読み直されていたら作り直す (それ以外の呼び出しではファイルを見ない)
+    """
+    now = time.monotonic()
+    with _BATCH_LOCK:
+        hit = _lru_get(_BATCHES, (day, scope))
+    if hit is not None and now - hit[0] < BATCH_RECHECK:
+        return hit[2]
+    dirs = [(ROUTES[ri], ROUTES[ri]["directions"][di]) for ri, dis in scope for di in dis]
+    tables = [route_timetable(r, d, day) for r, d in dirs]
+    ids = tuple(map(id, tables))
+    if hit is not None and hit[1] == ids:
+        batch = hit[2]
+    else:
+        batch = DepartureBatch(tables, [r["run"] for r, _ in dirs], [r["max"] for r, _ in dirs],
+                               [r["walk"] for r, _ in dirs])
+    with _BATCH_LOCK:
+        _lru_put(_BATCHES, (day, scope), (now, ids, batch), MAX_BATCHES)
+    return batch
+
+
+def _build_schedule(now: datetime, scope: Scope | None) -> dict:
+    labs = ["先発", "次発", "次々発"]
+    day = CALENDAR.day_type(now)   # 深夜 0:xx〜 は前日の営業日のダイヤ
+    now_sec = service_seconds(now)
+    res = {"current_time": now.strftime("%H:%M:%S"), "routes": []}
+
+    if scope is None:
+        scope = tuple((ri, tuple(range(len(r.get("directions", []))))) for ri, r in enumerate(ROUTES))
+    # 同じ表示対象の 1 日分 (/api/schedule/day?v=<版>) の版。版付きの URL は営業日の終わりまでキャッシュしてよい
+    res["day_version"] = day_schedule_entry(now, scope)[1]
+
+    # 全方面の次の発車をまとめて選び、表示用の文字列にするのは選ばれた便だけ
+    batch = departure_batch(day, scope)
+    picks = iter(batch.select(now_sec))
+    k = 0   # batch の方面番号
+    for ri, dis in scope:
+        r = ROUTES[ri]
         # travel = "(所要時間:15分)" if r["type"] == "train" else "(所要時間:10分)" # この行は削除またはコメントアウト
         # label = f"{r['label']} {travel}" # この行は削除またはコメントアウト
         # label は ROUTES で定義されたものをそのまま使うか、所要時間を動的に表示するなら別途考慮
-        ent = {"label": r['label']} # travel情報を削除
+        ent = {"id": r["id"], "label": r['label']} # travel情報を削除
         mp = {}
 
-        for d in r.get("directions", []):
-            if r["type"] == "train":
-                # ─── 電車 (CSV)
-                lst = fetch_train_schedule(r["line_code"], d["dest_tag"])
-            elif r["type"] == "bus_csv":
-                # ─── バス (CSVバージョン) - 追加
-                lst = fetch_bus_schedule_csv(r["type"], d["dest_tag"])
-            else:
-                # ─── バス (Excel)
-                sh  = sheet_name(r["type"], d.get("sheet_direction"))
-                lst = fetch_bus_schedule(sh, d["column"], r["file"]) # fetch_bus_scheduleも辞書を返すように変更が必要な場合あり
-
-            show, cnt = [], 0
-            for item in lst: # item は辞書 {"time": "HH:MM", "type": "種別", "dest": "行き先"} または時刻文字列
-                if cnt >= r["max"]:
-                    break
-                
-                current_time_str = ""
-                if isinstance(item, dict):
-                    current_time_str = item["time"]
-                elif isinstance(item, str): # バス時刻表が文字列リストを返す場合
-                    current_time_str = item
-                else:
-                    continue # 不明な形式はスキップ
-
-                rm = remaining(current_time_str)
-                if not (0 < rm.total_seconds() < 3600):
-                    continue
-                mins = rm.seconds // 60
-                if mins < r["run"]:
-                    continue
-                adv = "歩けば間に合います" if mins >= r["walk"] else "走れば間に合います"
-
-                display_parts = [f"{current_time_str}発"]
-
-                if isinstance(item, dict):
-                    train_type = item.get("type", "").strip()
-                    destination = item.get("dest", "").strip()
-
-                    if train_type and train_type not in ["-", "ー"]:
-                        display_parts.append(f"【{train_type}】")
-                    if destination and destination not in ["-", "ー"]:
-                        display_parts.append(f"{destination}行")
-                
-                display_parts.append(f"- {mins}分 {adv}")
-                show.append(f"{labs[cnt]}: {' '.join(display_parts)}")
-                cnt += 1
+        for di in dis:
+            d = r["directions"][di]
+            sel = next(picks)
+
+            show = []
+            for cnt, (i, mins, walkable) in enumerate(sel):
+                adv = "歩けば間に合います" if walkable else "走れば間に合います"
+                show.append(f"{labs[cnt]}: {batch.label(k, i)} - {mins}分 {adv}")
+            k += 1
             mp[d["column"]] = show
         ent["schedules"] = mp
         res["routes"].append(ent)
 
-    return jsonify(res)
+    return res
+
+
+@app.route("/api/schedule")
+def api_schedule():
+    # 残り分数は ceil(営業日の秒 / 60) だけで決まるので、その分単位のバケットでキャッシュする
+    # 表示対象 (routes / board / page) ごとに別エントリ
+    try:
+        scope = scope_from_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    now = datetime.now()
+    bucket = -(-service_seconds(now) // 60)
+    return cached_json(SCHEDULE_CACHE, (CALENDAR.service_date(now), bucket, scope),
+                       lambda: build_schedule(now, scope))
+
+DAY_SCHEDULE_CACHE = ResponseCache("schedule_day")
+
+
+def build_day_schedule(now: datetime, scope: Scope) -> dict:
+    """
+    営業日 1 日分の発車時刻 (端末側で残り分を数える用)。
+      t  : 発車分 (営業日の分) の差分符号化 [先頭, 差, 差, ...]
+      ty / de : 種別・行き先の番号 (types / dests の添字)
+    残り分・「歩けば/走れば」の判定・翌営業日の始発への跨ぎは /api/schedule と同じ規則で端末が計算する
+    """
+    day = CALENDAR.day_type(now)
+    sdate = CALENDAR.service_date(now)
+    batch = departure_batch(day, scope)
+    types: dict[str, int] = {}
+    dests: dict[str, int] = {}
+    routes = []
+    k = 0
+    for ri, dis in scope:
+        r = ROUTES[ri]
+        dirs = []
+        for di in dis:
+            tt = batch.tables[k]
+            k += 1
+            mins = list(tt.minutes)
+            dirs.append({"column": r["directions"][di]["column"],
+                         "t": mins[:1] + [b - a for a, b in zip(mins, mins[1:])],
+                         "ty": [types.setdefault(x, len(types)) for x in tt.types],
+                         "de": [dests.setdefault(x, len(dests)) for x in tt.dests]})
+        routes.append({"id": r["id"], "label": r["label"], "walk": r["walk"], "run": r["run"],
+                       "max": r["max"], "directions": dirs})
+    expires = CALENDAR.day_end(sdate)
+    return {"service_date": sdate.isoformat(), "day": day, "cutoff": CALENDAR.cutoff, "horizon": 60,
+            "expires": expires.isoformat(), "types": list(types), "dests": list(dests), "routes": routes}
+
+
+def day_schedule_key(now: datetime, scope: Scope) -> tuple:
+    """営業日・表示対象・時刻表 (連結済みの batch = 読み直されたら別物) が同じ間は同じ DAY_SCHEDULE_CACHE のキー"""
+    return CALENDAR.service_date(now), scope, departure_batch(CALENDAR.day_type(now), scope)
+
+
+def day_schedule_entry(now: datetime, scope: Scope) -> tuple[bytes, str, bytes | None]:
+    """
+    1 日分の (JSON, ETag, gzip)。ETag は本文のハッシュなので、ワーカーが違っても同じ内容なら同じ値
+    (= /api/schedule/day?v= の版)
+    """
+    return DAY_SCHEDULE_CACHE.get(day_schedule_key(now, scope), lambda: build_day_schedule(now, scope))
+
+
+@app.route("/api/schedule/day")
+def api_schedule_day():
+    # ?v=<版> (/api/schedule の day_version) が今の内容と一致する時だけ、営業日の終わり (expires) まで
+    # 共有キャッシュしてよい。版なし・古い版は no-cache + ETag (時刻表が読み直されたらすぐ新しい内容になる)
+    try:
+        scope = scope_from_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    now = datetime.now()
+    if scope is None:
+        scope = tuple((ri, tuple(range(len(r.get("directions", []))))) for ri, r in enumerate(ROUTES))
+    version = day_schedule_entry(now, scope)[1]
+    resp = cached_json(DAY_SCHEDULE_CACHE, day_schedule_key(now, scope), lambda: build_day_schedule(now, scope))
+    if request.args.get("v") == version:
+        expires = CALENDAR.day_end(CALENDAR.service_date(now))
+        resp.cache_control.no_cache = None
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        resp.cache_control.max_age = max(0, int((expires - now).total_seconds()))
+    return resp
+
+
+# ──────────────────────────────────────────
+#  API: 経路検索 (Connection Scan)
+# ──────────────────────────────────────────
+ORIGIN = "現在地"        # 案内板の場所。各路線の乗り場まで walk (急げば run) 分
+DEFAULT_TRANSFER = 3     # 乗り換えにかかる分 (同じ停留所で降りてから次に乗れるまで)
+TRANSFER_MINUTES: dict[str, int] = {"田園調布": 5, "多摩川": 5}   # 停留所ごとの乗り換え分 (バス停 ➜ ホームなど)
+
+
+class ConnectionIndex:
+    """
+    読み込み済みの時刻表から作る Connection Scan 用の索引 (ダイヤ種別ごと)。
+      接続 = 「便 trip が停留所 dep_stop を dep 分に出て、次の停留所 arr_stop に arr 分に着く」。
+      各方面の便 1 本につき乗り場 ➜ stops[0] ➜ stops[1] … と隣り合う停留所の間ごとに接続を作る
+      (途中の停留所からも乗れる。バスで多摩川に着いて、田園調布発の東横線に多摩川から乗る など)。
+      出発順に並べて列ごとの array に詰める。
+    検索は出発時刻以降の接続を 1 回走査するだけ (目的地に着ける時刻を過ぎたら打ち切る)。
+    乗った便の続きの接続は乗り換えなしで使える (便ごとに乗った接続を覚える)。
+    """
+
+    def __init__(self, day: str, tables: Sequence[tuple[int, int, Timetable]]) -> None:
+        self.day = day
+        self.tables = {(ri, di): tt for ri, di, tt in tables}
+        self.stops: dict[str, int] = {ORIGIN: 0}
+        sid = lambda name: self.stops.setdefault(name, len(self.stops))
+        rows = []
+        trips = 0
+        for ri, di, tt in tables:
+            r = ROUTES[ri]
+            hops, prev = [], (sid(r.get("stop") or r["label"]), 0)
+            for name, ride in sorted(r["directions"][di].get("stops", ()), key=lambda x: x[1]):
+                hops.append((prev[0], sid(name), prev[1], ride))
+                prev = (hops[-1][1], ride)
+            for i, m in enumerate(tt.minutes):
+                rows.extend((m + a, m + b, s0, s1, ri, di, i, trips + i) for s0, s1, a, b in hops)
+            trips += len(tt.minutes)
+        rows.sort()
+        self.dep, self.arr = array("H", (x[0] for x in rows)), array("H", (x[1] for x in rows))
+        self.dep_stop, self.arr_stop = array("H", (x[2] for x in rows)), array("H", (x[3] for x in rows))
+        self.route, self.direction = array("H", (x[4] for x in rows)), array("H", (x[5] for x in rows))
+        self.trip = array("I", (x[6] for x in rows))      # 時刻表の中での便の番号
+        self.trip_id = array("I", (x[7] for x in rows))   # 索引全体での便の番号
+        self.names = list(self.stops)
+        self.transfer = [TRANSFER_MINUTES.get(n, DEFAULT_TRANSFER) for n in self.names]
+        # 現在地 ➜ 乗り場 (歩き, 急ぎ)。同じ乗り場を使う路線が複数あれば短い方
+        self.access: dict[int, tuple[int, int]] = {}
+        for ri, _, _ in tables:
+            r = ROUTES[ri]
+            s0 = self.stops[r.get("stop") or r["label"]]
+            w, rn = self.access.get(s0, (r["walk"], r["run"]))
+            self.access[s0] = (min(w, r["walk"]), min(rn, r["run"]))
+
+    def __len__(self) -> int:
+        return len(self.dep)
+
+    def earliest(self, start: int, target: int, pace: str = "walk") -> tuple[int, list[dict]] | None:
+        """
+        start (営業日の分) に現在地を出て target に最も早く着く行程。
+        (到着時刻 (営業日の分), [{"mode": "walk" | "ride", ...}, ...]) を返す (着けなければ None)
+        """
+        inf = 1 << 30
+        n = len(self.names)
+        # via: 着いた乗車 (乗った接続, 降りた接続)。None は歩き
+        arrive, ready, via = [inf] * n, [inf] * n, [None] * n
+        boarded: dict[int, int] = {}   # 便 ➜ 乗った接続
+        for s0, (w, rn) in self.access.items():
+            t = start + (rn if pace == "run" else w)
+            arrive[s0] = ready[s0] = t
+        if target in self.access:
+            arrive[target] = start + self.access[target][pace == "run"]
+        dep, arr, ds, as_, trip = self.dep, self.arr, self.dep_stop, self.arr_stop, self.trip_id
+        for j in range(bisect_left(dep, min(ready, default=inf)), len(dep)):
+            if dep[j] >= arrive[target]:
+                break
+            first = boarded.get(trip[j])
+            if first is None:
+                if ready[ds[j]] > dep[j]:
+                    continue
+                first = boarded[trip[j]] = j
+            if arr[j] < arrive[as_[j]]:
+                t = as_[j]
+                arrive[t], via[t] = arr[j], (first, j)
+                ready[t] = arr[j] + self.transfer[t]
+        if arrive[target] >= inf:
+            return None
+        return arrive[target], self._legs(target, via, pace)
+
+    def _legs(self, target: int, via: list[tuple[int, int] | None], pace: str) -> list[dict]:
+        legs: list[dict] = []
+        s = target
+        while via[s] is not None:
+            j, k = via[s]
+            r = ROUTES[self.route[j]]
+            tt = self.tables[(self.route[j], self.direction[j])]
+            i = self.trip[j]
+            legs.append({"mode": "ride", "route": r["id"], "label": r["label"],
+                         "direction": r["directions"][self.direction[j]]["column"],
+                         "from": self.names[self.dep_stop[j]], "to": self.names[s],
+                         "dep": fmt_minutes(self.dep[j]), "arr": fmt_minutes(self.arr[k]),
+                         "type": tt.types[i], "dest": tt.dests[i]})
+            s = self.dep_stop[j]
+        legs.append({"mode": "walk", "from": ORIGIN, "to": self.names[s], "pace": pace,
+                     "minutes": self.access[s][pace == "run"]})
+        legs.reverse()
+        return legs
+
+
+MAX_CONNECTIONS = 16   # _CONNECTIONS に残す (ダイヤ種別, サイト) の数 (超えたら最も長く使われていないものから捨てる)
+# (ダイヤ種別, サイト) ➜ (確認した時刻, 時刻表の id, 索引)。_BATCHES と同じく _BATCH_LOCK で守る
+_CONNECTIONS: dict[tuple[str, str], tuple[float, tuple[int, ...], ConnectionIndex]] = {}
+
+
+def connection_index(day: str, site: str = DEFAULT_SITE) -> ConnectionIndex:
+    """
+    サイトの全路線の ConnectionIndex (現在地はサイトごとに違う)。
+    departure_batch と同じく BATCH_RECHECK 秒ごとに時刻表の入れ替わりを確かめる
+    """
+    now = time.monotonic()
+    with _BATCH_LOCK:
+        hit = _lru_get(_CONNECTIONS, (day, site))
+    if hit is not None and now - hit[0] < BATCH_RECHECK:
+        return hit[2]
+    tables = [(ri, di, route_timetable(r, d, day))
+              for ri, r in enumerate(ROUTES) if r.get("site", DEFAULT_SITE) == site
+              for di, d in enumerate(r["directions"])]
+    ids = tuple(id(tt) for _, _, tt in tables)
+    if hit is not None and hit[1] == ids:
+        index = hit[2]
+    else:
+        with METRICS.timer("plan_index_seconds"):
+            index = ConnectionIndex(day, tables)
+    with _BATCH_LOCK:
+        _lru_put(_CONNECTIONS, (day, site), (now, ids, index), MAX_CONNECTIONS)
+    return index
+
+
+@app.route("/api/plan")
+def api_plan():
+    """
+    ?to=<停留所>[&at=HH:MM][&pace=walk|run][&site=<サイト>] … 現在地 (または at) から to に最も早く着く行程
+    at は今から見て次に来るその時刻 (過ぎていれば翌日)。ダイヤ種別はその時刻の営業日で決める。
+    to が無い・不明なら 400 と停留所の一覧
+    """
+    now = datetime.now()
+    site = request.args.get("site") or DEFAULT_SITE
+    if site not in SITES:
+        return jsonify({"error": f"unknown site: {site}"}), 400
+    pace = request.args.get("pace", "walk")
+    if pace not in ("walk", "run"):
+        return jsonify({"error": f"unknown pace: {pace}"}), 400
+    at = request.args.get("at")
+    if at:
+        try:
+            h, m = map(int, at.split(":"))
+        except ValueError:
+            return jsonify({"error": f"bad time: {at}"}), 400
+        if not (0 <= h < 24 and 0 <= m < 60):
+            return jsonify({"error": f"bad time: {at}"}), 400
+        when = now.replace(hour=h, minute=m, second=0, microsecond=0)
+        if when < now.replace(second=0, microsecond=0):
+            when += timedelta(days=1)
+        start = to_service_minutes(h, m)
+    else:
+        when = now
+        start = -(-service_seconds(now) // 60)
+    day = CALENDAR.day_type(when)
+    index = connection_index(day, site)
+    to = request.args.get("to", "")
+    target = index.stops.get(to)
+    if target is None or target == 0:
+        return jsonify({"error": f"unknown stop: {to}", "stops": index.names[1:]}), 400
+    with METRICS.timer("plan_seconds"):
+        found = index.earliest(start, target, pace)
+    if found is None:
+        return jsonify({"from": ORIGIN, "to": to, "day": day, "depart": fmt_minutes(start), "arrive": None,
+                        "legs": []})
+    end, legs = found   # end は営業日の分のまま (24:00 を過ぎても折り返さない)
+    return jsonify({"from": ORIGIN, "to": to, "day": day, "depart": fmt_minutes(start), "arrive": fmt_minutes(end),
+                    "minutes": end - start, "legs": legs})
+
+# ──────────────────────────────────────────
+#  上流データのバックグラウンド更新 (stale-while-revalidate)
+# ──────────────────────────────────────────
+class Snapshot(NamedTuple):
+    data: object
+    updated: float | None   # 最後に取得成功した時刻 (time.time())。未取得なら None
+    error: str | None       # 直近の更新失敗理由 (成功時は None)
+
+    @property
+    def age(self) -> int | None:
+        return None if self.updated is None else int(time.time() - self.updated)
+
+
+# 複数ワーカーで上流の取得結果を共有するディレクトリ (gunicorn.conf.py / asgi.py が /dev/shm に設定)。
+# 未設定なら共有しない (開発用の単一プロセス)
+SHARED_DIR = Path(os.environ["TIMETABLE_SHARED_DIR"]) if os.environ.get("TIMETABLE_SHARED_DIR") else None
+
+
+class SharedSnapshots:
+    """
+    ワーカー間で上流のスナップショットを共有する。
+      ・フィードごとのロックファイルを flock で取れたワーカーだけが上流を取得し (リーダー)、
+        結果を dir/<name>.json に原子的に書く
+      ・他のワーカーはファイルの mtime が変わった時だけ読み直す
+    リーダーのプロセスが終わればロックは OS が外すので、次に試したワーカーが引き継ぐ。
+    flock の無い環境 (Windows) では全員がリーダーとして動く。
+    """
+
+    def __init__(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        self.dir = directory
+        self._locks: dict[str, int] = {}
+        self._cache: dict[str, tuple[int, Snapshot]] = {}
+
+    def try_lead(self, name: str) -> bool:
+        if name in self._locks or fcntl is None:
+            return True
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)   # 途中で消された時のため
+            fd = os.open(self.dir / f"{name}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            LOG.warn(f"shared lock error: {e}", key=f"shared-lock:{name}")
+            return True   # 共有できなければ自分で取得する
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._locks[name] = fd
+        return True
+
+    def save(self, name: str, snap: Snapshot) -> None:
+        path = self.dir / f"{name}.json"
+        tmp = path.with_name(f"{name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(snap._asdict(), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def load(self, name: str) -> Snapshot | None:
+        path = self.dir / f"{name}.json"
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            return None
+        hit = self._cache.get(name)
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+        try:
+            snap = Snapshot(**json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError, TypeError) as e:
+            LOG.warn(f"shared snapshot read error: {path} - {e}", key=f"shared:{name}")
+            return hit[1] if hit is not None else None
+        self._cache[name] = (mtime, snap)
+        return snap
+
+
+SHARED = SharedSnapshots(SHARED_DIR) if SHARED_DIR is not None else None
+
+
+class BackgroundRefresher:
+    """
+    上流 API を専用スレッドで interval 秒ごとに取得し、最後に成功した結果を保持する。
+    リクエスト側は get() でスナップショットを即座に受け取るだけで、上流を待たない。
+    (初回取得が終わっていない時だけ first_wait 秒まで待つ)
+    shared があれば、上流を取得するのはリーダーのワーカーだけで、他は共有ファイルを
+    follow_every 秒ごとに読み直す。
+    """
+
+    def __init__(self, name: str, fetch: Callable[[], object], interval: float,
+                 empty: object, valid: Callable[[object], bool] = bool,
+                 first_wait: float = 8.0, shared: SharedSnapshots | None = None,
+                 follow_every: float = 2.0) -> None:
+        self.name = name
+        self.fetch = fetch
+        self.interval = interval
+        self.valid = valid
+        self.first_wait = first_wait
+        self.shared = shared
+        self.follow_every = follow_every
+        self._snap = Snapshot(empty, None, None)
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"refresh-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            if self.shared is None or self.shared.try_lead(self.name):
+                self.refresh()
+                time.sleep(self.interval)
+            else:
+                self.follow()
+                time.sleep(self.follow_every)
+
+    def follow(self) -> None:
+        """リーダーが書いた共有スナップショットを取り込む"""
+        snap = self.shared.load(self.name)
+        if snap is not None:
+            self._snap = snap
+            self._ready.set()
+
+    def refresh(self) -> Snapshot:
+        try:
+            with METRICS.timer("refresh_seconds", feed=self.name):
+                data = self.fetch()
+            if self.valid(data):
+                self._snap = Snapshot(data, time.time(), None)
+                METRICS.inc("refresh_total", feed=self.name, result="ok")
+            else:
+                self._snap = self._snap._replace(error="empty result")
+                METRICS.inc("refresh_total", feed=self.name, result="empty")
+        except Exception as e:
+            LOG.warn(f"{self.name} refresh error: {e}", key=f"refresh:{self.name}")
+            METRICS.inc("refresh_total", feed=self.name, result="error")
+            self._snap = self._snap._replace(error=str(e))
+        if self.shared is not None:
+            try:
+                self.shared.save(self.name, self._snap)
+            except OSError as e:
+                LOG.warn(f"shared snapshot write error: {e}", key=f"shared-write:{self.name}")
+        self._ready.set()
+        return self._snap
+
+    def peek(self) -> Snapshot:
+        """スレッドを起こさず、今あるスナップショットを返す (計測用)"""
+        return self._snap
+
+    def get(self) -> Snapshot:
+        self.start()
+        if not self._ready.is_set():
+            self._ready.wait(self.first_wait)
+        return self._snap
+
+
+def snapshot_payload(snap: Snapshot, payload: dict) -> dict:
+    """payload にスナップショットの取得時刻 (updated_at) を付ける"""
+    payload["updated_at"] = (datetime.fromtimestamp(snap.updated).isoformat(timespec="seconds")
+                             if snap.updated else None)
+    return payload
+
+
+def snapshot_json(snap: Snapshot, payload: dict) -> Response:
+    """スナップショットの内容を、取得時刻と経過秒 (Age ヘッダ) 付きで返す"""
+    resp = jsonify(snapshot_payload(snap, payload))
+    if snap.age is not None:
+        resp.headers["Age"] = str(snap.age)
+    return resp
+
+
+PANEL_CACHE = ResponseCache("panel", max_entries=8)
+
+
+def panel_json(name: str, snap: Snapshot, project: Callable[[object], object]) -> Response:
+    """
+    スナップショットを project で画面が使う項目だけに絞って返す。
+    取得 1 回 (snap.updated) につき 1 回だけ組み立て・直列化・圧縮し、以降は同じバイト列 (ETag 付き)
+    """
+    resp = cached_json(PANEL_CACHE, (name, snap.updated), lambda: snapshot_payload(snap, project(snap.data)))
+    if snap.age is not None:
+        resp.headers["Age"] = str(snap.age)
+    return resp
+
 
 # ──────────────────────────────────────────
 #  API: 天気情報
@@ -454,15 +1800,38 @@ W_URL = "https://weather.tsukumijima.net/api/forecast/city/130010"
 
 def get_weather() -> dict:
     try:
-        return requests.get(W_URL, timeout=6).json()
+        return HTTP.get_json(W_URL)
     except Exception as e:
-        print("Weather error:", e)
+        LOG.warn(f"Weather error: {e}", key="weather")
+        return {}
+
+
+WEATHER = BackgroundRefresher("weather", get_weather, interval=600, empty={}, shared=SHARED)
+
+
+def weather_panel(data: dict) -> dict:
+    """
+    天気パネルが描く項目だけ (3 日分の日付・天気・アイコン・午後の降水確率・風)。
+    入れ子の形は上流と同じなので、古い app.js もそのまま読める
+    """
+    if not data.get("forecasts"):
         return {}
+    return {"forecasts": [
+        {"dateLabel": f.get("dateLabel", ""), "telop": f.get("telop", ""),
+         "image": {"url": (f.get("image") or {}).get("url", "")},
+         "chanceOfRain": {"T12_18": (f.get("chanceOfRain") or {}).get("T12_18", "")},
+         "detail": {"wind": (f.get("detail") or {}).get("wind", "")}}
+        for f in data["forecasts"][:3]
+    ]}
 
 
 @app.route("/api/weather")
 def api_weather():
-    return jsonify(get_weather())
+    # ?full=1 : 上流 (天気予報 API) の JSON をそのまま返す
+    snap = WEATHER.get()
+    if request.args.get("full") == "1":
+        return snapshot_json(snap, dict(snap.data))
+    return panel_json("weather", snap, weather_panel)
 
 # ──────────────────────────────────────────
 #  API: ニュース
@@ -471,26 +1840,123 @@ NHK = "https://www3.nhk.or.jp/rss/news/cat0.xml"
 GGL = "https://news.google.com/rss/search?q=東急&hl=ja&gl=JP&ceid=JP:ja"
 
 
-def get_news() -> list[str]:
-    out, seen = [], set()
-    for url in (NHK, GGL):
+def parse_feed(res: HttpResult) -> feedparser.FeedParserDict:
+    with METRICS.timer("parse_seconds", stage="feedparser"):
+        return feedparser.parse(res.content)
+
+
+class NewsStore:
+    """
+    見出しを取り込んで、重複のない直近 window 件を保持する。
+      ・各フィードの先頭 per_feed 件だけを見る。GUID (無ければリンク・見出し) と見出しで重複を除く
+      ・本文が前回と同じ (304 / 上流エラーでキャッシュを返した) フィードは解析しない
+      ・取り込んだ順に通し番号 seq を振り、window を超えたら古い順に捨てる
+      ・一度見た GUID は捨てた後も seen_max 件まで覚えておく (フィードに残っている古い記事を再度取り込まない)
+    snapshot() は JSON にできる dict なので、SharedSnapshots でそのままワーカー間共有できる。
+    """
+
+    def __init__(self, window: int = 10, per_feed: int = 5, seen_max: int = 500) -> None:
+        self.window = window
+        self.per_feed = per_feed
+        self.seen_max = seen_max
+        self.epoch = int(time.time())   # 起動ごとに変わる。カーソルの世代判定に使う
+        self.seq = 0
+        self.items: deque[dict] = deque()
+        self._seen: dict[str, None] = {}         # GUID・見出し (挿入順 = 古い順)
+        self._last: dict[str, bytes] = {}        # URL ➜ 最後に取り込んだ本文
+        self._lock = threading.Lock()
+
+    def restore(self, data: dict) -> None:
+        """共有スナップショットから引き継ぐ (リーダーが交代した時にカーソルを連続させる)"""
+        with self._lock:
+            self.epoch, self.seq = data["epoch"], data["seq"]
+            self.items = deque(data["items"])
+            for it in self.items:
+                self._remember(it["guid"], it["title"])
+
+    def _remember(self, *keys: str) -> None:
+        for k in keys:
+            self._seen[k] = None
+        while len(self._seen) > self.seen_max:
+            del self._seen[next(iter(self._seen))]
+
+    def ingest(self, url: str, res: HttpResult, source: str) -> int:
+        """フィード 1 本を取り込み、新しく入った件数を返す"""
+        if self._last.get(url) is res.content:
+            METRICS.inc("news_feed_total", source=source, result="unchanged")
+            return 0
+        feed = parse_feed(res)
+        entries = []
+        for e in feed.entries[:self.per_feed]:
+            title = html.unescape(e.get("title", "")).strip()
+            if not title:
+                continue
+            t = e.get("published_parsed") or e.get("updated_parsed")
+            entries.append({"guid": e.get("id") or e.get("link") or title, "title": title, "source": source,
+                            "published": datetime(*t[:6]).isoformat() if t else None})
+        added = 0
+        with self._lock:
+            for it in reversed(entries):   # フィードは新しい順なので、古い方から番号を振る
+                if it["guid"] in self._seen or it["title"] in self._seen:
+                    continue
+                self.seq += 1
+                it["seq"] = self.seq
+                self.items.append(it)
+                self._remember(it["guid"], it["title"])
+                added += 1
+            while len(self.items) > self.window:
+                self.items.popleft()
+            self._last[url] = res.content
+        METRICS.inc("news_feed_total", source=source, result="parsed")
+        METRICS.inc("news_items_total", added, source=source)
+        return added
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"epoch": self.epoch, "seq": self.seq, "window": self.window, "items": list(self.items)}
+
+
+NEWS_FEEDS = (("nhk", NHK), ("google", GGL))
+NEWS_STORE = NewsStore()
+
+
+def get_news() -> dict:
+    if NEWS_STORE.seq == 0 and NEWS.peek().data.get("items"):
+        NEWS_STORE.restore(NEWS.peek().data)   # 他のワーカーから取得役を引き継いだ
+    for source, url in NEWS_FEEDS:
         try:
-            feed = feedparser.parse(url)
-            for e in feed.entries[:5]:
-                t = html.unescape(e.title)
-                if t not in seen:
-                    out.append(t)
-                    seen.add(t)
-                if len(out) >= 10:
-                    break
-        except Exception:
-            pass
-    return out
+            NEWS_STORE.ingest(url, HTTP.get(url), source)
+        except Exception as e:
+            LOG.warn(f"News error ({url}): {e}", key=f"news:{url}")
+    return NEWS_STORE.snapshot()
+
+
+def news_payload(data: dict, since: str | None = None) -> dict:
+    """
+    ニュースの応答。見出しは新しい順。
+      since なし / 世代違い : 全件 (reset: true)
+      since = 前回の cursor : それ以降に入った見出しだけ (reset: false)。
+                              クライアントは先頭に足して window 件に切り詰めれば、サーバーと同じ並びになる
+    """
+    items = data.get("items", [])
+    cursor = f"{data.get('epoch', 0)}.{data.get('seq', 0)}"
+    epoch, _, seq = (since or "").partition(".")
+    reset = not seq.isdigit() or epoch != str(data.get("epoch")) or int(seq) > data.get("seq", 0)
+    if not reset:
+        items = [it for it in items if it["seq"] > int(seq)]
+    return {"news": [it["title"] for it in reversed(items)], "cursor": cursor,
+            "reset": reset, "window": data.get("window", len(items))}
+
+
+NEWS = BackgroundRefresher("news", get_news, interval=120, empty={},
+                           valid=lambda d: bool(d.get("items")), shared=SHARED)
 
 
 @app.route("/api/news")
 def api_news():
-    return jsonify({"news": get_news()})
+    # ?since=<前回の cursor> で差分だけを返す
+    snap = NEWS.get()
+    return snapshot_json(snap, news_payload(snap.data, request.args.get("since")))
 
 # ──────────────────────────────────────────
 #  API: 運行情報 (Tokyu + ODPT)
@@ -507,6 +1973,12 @@ OPS = {
     "横浜市交通局": "odpt.Operator:YokohamaMunicipal",
 }
 
+ODPT_BASE = "https://api.odpt.org/api/v4"
+ODPT_DEADLINE = 8.0   # fetch_odpt 全体の締め切り (秒)
+
+# ODPT 並行取得用スレッドプール (運行情報と、裏で取り直す路線メタデータで事業者あたり 2 本)
+_ODPT_POOL = ThreadPoolExecutor(max_workers=2 * len(OPS), thread_name_prefix="odpt")
+
 RAIL_NAME_MAP = {
     "Fukutoshin": "副都心線",
     "Namboku": "南北線",
@@ -532,61 +2004,362 @@ RAIL_NAME_MAP = {
 }
 
 
-@lru_cache(maxsize=None)
+RAILWAY_CACHE_FILE = DATA_DIR / "odpt_railways.json"   # 事業者ごとの路線メタデータ (自動生成)
+LOGO_DIR = STATIC_DIR / "logos"                          # ODPT のロゴ画像の写し (自動生成)
+LOGO_MAX_AGE = 365 * 86400                               # ファイル名が内容のハッシュなので長期キャッシュしてよい
+
+
+class RailwayCache:
+    """
+    ODPT の路線メタデータ (路線コード ➜ 日本語名・ロゴ URL) を事業者ごとにファイルへ保存する。
+      ・取得できた事業者は ttl 秒 (既定 7 日) そのまま使う。再起動しても ODPT に問い合わせない
+      ・失敗・空の結果は negative_ttl 秒 (既定 10 分) だけ覚えておき、過ぎたらまた試す
+        (前回成功した内容があれば、失敗している間もそれを使い続ける)
+      ・ロゴ画像は logo_dir/<内容のハッシュ>.<拡張子> に保存して自前で配信する。
+        max_logos 個・max_logo_bytes バイトを超えたら、どの路線からも参照されていないものを古い順に消す
+      ・運行情報の取得は refresh() で取り直しを裏に投げ、logos() で手元にある分だけを使う (ロゴを待たない)
+    """
+
+    def __init__(self, path: Path, logo_dir: Path, ttl: float = 7 * 86400, negative_ttl: float = 600,
+                 max_logos: int = 200, max_logo_bytes: int = 20 * 1024 * 1024) -> None:
+        self.path = path
+        self.logo_dir = logo_dir
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_logos = max_logos
+        self.max_logo_bytes = max_logo_bytes
+        self._lock = threading.Lock()
+        self._pending: set[str] = set()   # 取り直し中の事業者
+        try:
+            self._data: dict[str, dict] = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self._data = {}
+        except (OSError, ValueError) as e:
+            LOG.warn(f"railway cache read error: {path} - {e}")
+            self._data = {}
+
+    def railways(self, operator_code: str) -> dict[str, dict]:
+        """路線コード ➜ {"name", "logo" (配信用のパス or None), "src" (ODPT 上の URL)}"""
+        ent = self._data.get(operator_code)
+        if ent is not None and self._fresh(ent):
+            METRICS.inc("railway_cache_total", result="hit" if ent["ok"] else "negative")
+            return ent["railways"]
+        METRICS.inc("railway_cache_total", result="miss")
+        old = ent["railways"] if ent is not None else {}
+        try:
+            fresh = self._fetch(operator_code, old)
+        except Exception as e:
+            LOG.warn(f"Railway API error ({operator_code}): {e}", key=f"railway:{operator_code}")
+            fresh = {}
+        ent = {"checked": time.time(), "ok": bool(fresh), "railways": fresh or old}
+        with self._lock:
+            self._data[operator_code] = ent
+            self._save()
+            self._evict()
+        return ent["railways"]
+
+    def refresh(self, operator_code: str, executor: ThreadPoolExecutor) -> None:
+        """期限切れなら executor で取り直す (待たない)。取り直し中の事業者には重ねて投げない"""
+        ent = self._data.get(operator_code)
+        if ent is not None and self._fresh(ent):
+            return
+        with self._lock:
+            if operator_code in self._pending:
+                return
+            self._pending.add(operator_code)
+
+        def run() -> None:
+            try:
+                self.railways(operator_code)
+            finally:
+                with self._lock:
+                    self._pending.discard(operator_code)
+
+        executor.submit(run)
+
+    def logos(self, operator_code: str) -> dict[str, str]:
+        """路線コード ➜ ロゴ URL (手元にあればそのパス、なければ ODPT 上の URL)。ODPT には問い合わせない"""
+        ent = self._data.get(operator_code)
+        out = {}
+        for rc, it in (ent["railways"] if ent is not None else {}).items():
+            if it["logo"] and (self.logo_dir / it["logo"].rsplit("/", 1)[-1]).exists():
+                out[rc] = it["logo"]
+            elif it["src"]:
+                out[rc] = it["src"]
+        return out
+
+    def _fresh(self, ent: dict) -> bool:
+        return time.time() - ent["checked"] < (self.ttl if ent["ok"] else self.negative_ttl)
+
+    def name(self, operator_code: str, rc: str) -> str | None:
+        ent = self._data.get(operator_code)
+        it = ent["railways"].get(rc) if ent is not None else None
+        return it["name"] if it else None
+
+    def _fetch(self, operator_code: str, old: dict[str, dict]) -> dict[str, dict]:
+        url = f"{ODPT_BASE}/odpt:Railway?odpt:operator={operator_code}&acl:consumerKey={CK}"
+        out: dict[str, dict] = {}
+        for it in HTTP.get_json(url):
+            rc = it.get("odpt:railway", "").split(":")[-1].split(".")[-1]
+            if not rc:
+                continue
+            title = it.get("odpt:railwayTitle") or {}
+            src = it.get("odpt:systemMap")
+            prev = old.get(rc) or {}
+            logo = prev.get("logo") if prev.get("src") == src else None
+            if src and (logo is None or not (self.logo_dir / logo.rsplit("/", 1)[-1]).exists()):
+                logo = self._store_logo(src)
+            out[rc] = {"name": title.get("ja") or it.get("dc:title") or rc, "logo": logo, "src": src}
+        return out
+
+    def _store_logo(self, src: str) -> str | None:
+        """ロゴ画像を取ってきて logo_dir に保存し、配信用のパスを返す (失敗したら None)"""
+        try:
+            body = HTTP.get(src).content
+        except Exception as e:
+            LOG.warn(f"logo download error: {src} - {e}", key=f"logo:{src}")
+            return None
+        ext = Path(src.split("?", 1)[0]).suffix.lower()
+        name = hashlib.blake2b(body, digest_size=12).hexdigest() + (ext if ext in (".png", ".svg", ".gif", ".jpg") else "")
+        path = self.logo_dir / name
+        if not path.exists():
+            self.logo_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{name}.{os.getpid()}.tmp")
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+            METRICS.inc("logo_downloads_total")
+        else:
+            os.utime(path)   # 参照されたので追い出し順を後ろへ
+        return f"/static/logos/{name}"
+
+    def _evict(self) -> None:
+        """上限を超えていれば、どの路線からも参照されていないロゴを古い順に消す (参照中のものは上限を超えても残す)"""
+        if not self.logo_dir.is_dir():
+            return
+        used = {it["logo"].rsplit("/", 1)[-1]
+                for ent in self._data.values() for it in ent["railways"].values() if it.get("logo")}
+        files = sorted((p.stat().st_mtime, p.stat().st_size, p) for p in self.logo_dir.iterdir() if p.is_file())
+        count, total = len(files), sum(size for _, size, _ in files)
+        for _, size, p in files:
+            if count <= self.max_logos and total <= self.max_logo_bytes:
+                break
+            if p.name in used:
+                continue
+            p.unlink(missing_ok=True)
+            count -= 1
+            total -= size
+
+    def _save(self) -> None:
+        try:
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(self._data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            LOG.warn(f"railway cache write error: {e}", key="railway-cache-write")
+
+
+RAILWAYS = RailwayCache(RAILWAY_CACHE_FILE, LOGO_DIR)
+
+
 def get_line_logos(operator_code: str) -> dict[str, str]:
-    """事業者ごとの路線ロゴ（systemMap URL）を dict で返す"""
-    url = (
-        f"https://api.odpt.org/api/v4/odpt:Railway"
-        f"?odpt:operator={operator_code}&acl:consumerKey={CK}"
-    )
+    """事業者ごとの路線ロゴ（systemMap の写し）を dict で返す (手元にある分だけ。取り直しは RAILWAYS.refresh)"""
+    return RAILWAYS.logos(operator_code)
+
+
+@app.route("/static/logos/<name>")
+def logo_file(name: str):
+    resp = send_from_directory(LOGO_DIR, name, max_age=LOGO_MAX_AGE)
+    resp.headers["Cache-Control"] += ", immutable"
+    return resp
+
+
+# 運行状況の文言 ➜ 深刻度 (上から順に判定。どれにも当たらなければ info)
+SEVERITY_WORDS = (
+    ("normal",    ("平常運転", "通常運転", "Normal")),
+    ("suspended", ("運転見合わせ", "運休", "運転を見合わせ")),
+    ("delay",     ("遅れ", "遅延", "ダイヤ乱れ", "ダイヤが乱れ", "直通運転中止", "直通運転を中止")),
+)
+
+
+def severity_of(text: str) -> str:
+    for sev, words in SEVERITY_WORDS:
+        if any(w in text for w in words):
+            return sev
+    return "info"
+
+
+def status_record(operator: str, line: str, text: str, time_: str = "",
+                  logo: str | None = None, display: str | None = None) -> dict[str, str | None]:
+    """
+    運行情報 1 件 (/api/status の 1 要素)。text は従来どおりの表示用文字列、
+    operator / line / severity / time / detail は画面側で並べ替え・色分けするための項目
+    """
+    return {"logo": logo, "text": display or text, "operator": operator, "line": line,
+            "severity": severity_of(text), "time": time_, "detail": text}
+
+
+class _TokyuStatusParser(HTMLParser):
+    """
+    東急公式の運行情報ページ。.service-info の中の <li> 1 つが 1 路線
+      <div class="service-info"><ul><li><time>8:00</time>目黒線 遅延 …</li> …
+    .service-info が閉じたら _SectionEnd で打ち切り、それより後ろは読まない
+    """
+
+    class _SectionEnd(Exception):
+        pass
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.out: list[tuple[str, str]] = []   # (時刻, 本文)
+        self._box: str | None = None            # .service-info の要素名
+        self._depth = 0
+        self._li: list[str] | None = None       # <li> の本文 (<time> の中身は除く)
+        self._time: list[str] = []
+        self._in_time = False
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if self._box is None:
+            if "service-info" in (dict(attrs).get("class") or "").split():
+                self._box, self._depth = tag, 1
+            return
+        if tag == self._box:
+            self._depth += 1
+        elif tag == "li":
+            self._li, self._time = [], []
+        elif tag == "time" and self._li is not None:
+            self._in_time = True
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._box is None:
+            return
+        if tag == self._box:
+            self._depth -= 1
+            if self._depth == 0:
+                raise self._SectionEnd
+        elif tag == "time":
+            self._in_time = False
+        elif tag == "li" and self._li is not None:
+            txt = "".join(t.strip() for t in self._li)
+            if txt:
+                self.out.append(("".join(self._time).strip(), txt))
+            self._li = None
+
+    def handle_data(self, data: str) -> None:
+        if self._li is not None:
+            (self._time if self._in_time else self._li).append(data)
+
+
+# タグ 1 つ (コメント・<script>・<style> の中身は飛ばす) と class 属性
+_TAG_RE = re.compile(rb"<!--.*?-->|<(script|style)\b.*?</\1\s*>|<(/?)([a-zA-Z][^\s/>]*)([^>]*)>", re.S | re.I)
+_CLASS_RE = re.compile(rb"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.I)
+
+
+def tokyu_section(body: bytes) -> tuple[int, int] | None:
+    """
+    ページのうち class に service-info を含む要素の範囲 (開始タグの先頭, 対応する終了タグの末尾)。
+    _TokyuStatusParser と同じく class のトークンで探し、同名タグの入れ子を数えて閉じる所までを返す
+    (閉じていなければページ末尾まで)。fetch_tokyu はこの範囲だけをハッシュし、この範囲だけを解析する
+    """
+    box, depth, start = None, 0, 0
+    for m in _TAG_RE.finditer(body):
+        if m.group(3) is None:   # コメント・<script>・<style>
+            continue
+        close, name, attrs = m.group(2), m.group(3).lower(), m.group(4)
+        if box is None:
+            cls = _CLASS_RE.search(attrs) if not close else None
+            if cls and b"service-info" in next(g for g in cls.groups() if g is not None).split():
+                box, depth, start = name, 1, m.start()
+            continue
+        if name != box or attrs.rstrip().endswith(b"/"):
+            continue
+        depth += -1 if close else 1
+        if depth == 0:
+            return start, m.end()
+    return None if box is None else (start, len(body))
+
+
+def parse_tokyu(section: bytes) -> list[tuple[str, str]]:
+    """.service-info の範囲 (tokyu_section) をチャンクごとに流し込み、(時刻, 本文) を返す (木は作らない)"""
+    parser = _TokyuStatusParser()
+    dec = codecs.getincrementaldecoder("utf-8")(errors="replace")
     try:
-        js = requests.get(url, timeout=6).json()
-        result: dict[str, str] = {}
-        for it in js:
-            rc = it.get("odpt:railway", "").split(":")[-1].split(".")[-1]
-            logo = it.get("odpt:systemMap")
-            if logo:
-                result[rc] = logo
-        return result
-    except Exception as e:
-        print(f"Railway API error ({operator_code}):", e)
-        return {}
+        for i in range(0, len(section), 16 * 1024):
+            parser.feed(dec.decode(section[i:i + 16 * 1024]))
+        parser.feed(dec.decode(b"", final=True))
+        parser.close()
+    except _TokyuStatusParser._SectionEnd:
+        pass
+    return parser.out
+
+
+_LINE_RE = re.compile(r"^(?:東急)?(\S+?線)")
+_tokyu_last: tuple[bytes, list[dict]] | None = None   # (.service-info のハッシュ, 異常のみのレコード)
 
 
-def fetch_tokyu() -> list[str]:
-    """東急公式サイトをスクレイプし、異常メッセージのみを返す"""
+def fetch_tokyu() -> list[dict[str, str | None]] | None:
+    """
+    東急公式サイトをスクレイプし、異常のある路線のレコードだけを返す (取得・解析できなければ None)。
+    .service-info の範囲だけをハッシュし、前回と同じならパースしない (ハッシュする範囲 = 解析する範囲)
+    """
+    global _tokyu_last
     try:
-        r = requests.get(TOKYU_URL, timeout=6)
-        r.encoding = "utf-8"
-        soup = BeautifulSoup(r.text, "html.parser")
-        msgs: list[str] = []
-        for li in soup.select(".service-info li"):
-            txt = li.get_text(strip=True)
-            if any(w in txt for w in ("平常運転", "通常運転")):
+        body = HTTP.get(TOKYU_URL).content
+        span = tokyu_section(body)
+        if span is None:
+            LOG.warn("Tokyu scrape error: .service-info not found", key="tokyu")
+            return None
+        section = body[span[0]:span[1]]
+        digest = hashlib.blake2b(section, digest_size=16).digest()
+        if _tokyu_last is not None and _tokyu_last[0] == digest:
+            METRICS.inc("tokyu_parse_total", result="unchanged")
+            return _tokyu_last[1]
+        with METRICS.timer("parse_seconds", stage="tokyu_html"):
+            rows = parse_tokyu(section)
+        recs = []
+        for tm, txt in rows:
+            if severity_of(txt) == "normal":
                 continue
-            tm = li.find("time")
-            pre = tm.text.strip() if tm else ""
-            msgs.append(f"東急電鉄・{pre}{txt}")
-        return msgs
+            m = _LINE_RE.match(txt)
+            recs.append(status_record("東急電鉄", m.group(1) if m else "", txt, tm,
+                                      display=f"東急電鉄・{tm}{txt}"))
+        METRICS.inc("tokyu_parse_total", result="parsed")
+        _tokyu_last = (digest, recs)
+        return recs
     except Exception as e:
-        print("Tokyu scrape error:", e)
-        return []
+        LOG.warn(f"Tokyu scrape error: {e}", key="tokyu")
+        return None
 
 
-def fetch_odpt() -> list[dict[str, str]]:
+def _odpt_train_information(code: str) -> list[dict]:
+    url = f"{ODPT_BASE}/odpt:TrainInformation?odpt:operator={code}&acl:consumerKey={CK}"
+    return HTTP.get_json(url)
+
+
+def fetch_odpt(deadline: float = ODPT_DEADLINE) -> list[dict[str, str | None]] | None:
     """
-    ODPT API から異常情報のみ取得し、
-    {"logo": URL or None, "text": "..."} のリストを返す
+    ODPT API から異常情報のみ取得し、status_record のリストを返す (1 事業者も取得できなければ None)
+    全事業者の TrainInformation を並行に取得し、deadline 秒以内に返ってきた事業者の分だけを返す。
+    路線名・ロゴ (Railway) は期限切れなら裏で取り直すだけで待たず、今回は手元にある分を使う
     """
-    base = "https://api.odpt.org/api/v4/odpt:TrainInformation"
-    out: list[dict[str, str]] = []
-
+    t0 = time.perf_counter()
+    for code in OPS.values():
+        RAILWAYS.refresh(code, _ODPT_POOL)
+    info_futs = {code: _ODPT_POOL.submit(_odpt_train_information, code) for code in OPS.values()}
+    done, _ = wait(info_futs.values(), timeout=deadline)
+
+    out: list[dict[str, str | None]] = []
+    fetched = 0
     for op_name, code in OPS.items():
+        fut = info_futs[code]
+        if fut not in done:
+            LOG.warn(f"ODPT fetch timeout ({op_name}): > {deadline}s", key=f"odpt-timeout:{op_name}")
+            METRICS.inc("odpt_deadline_exceeded_total", operator=op_name)
+            continue
         logos = get_line_logos(code)
-        url = f"{base}?odpt:operator={code}&acl:consumerKey={CK}"
         try:
-            js = requests.get(url, timeout=6).json()
-            for it in js:
+            infos = fut.result()
+            fetched += 1
+            for it in infos:
                 txt = (
                     it.get("odpt:trainInformationText")
                     or it.get("odpt:trainInformationStatus")
@@ -599,23 +2372,370 @@ def fetch_odpt() -> list[dict[str, str]]:
                     continue
 
                 rc = it.get("odpt:railway", "").split(":")[-1].split(".")[-1]
-                rail_ja = RAIL_NAME_MAP.get(rc, rc)
-                logo = logos.get(rc)
-                out.append({"logo": logo, "text": f"{op_name}・{rail_ja}➡{txt}"})
+                rail_ja = RAIL_NAME_MAP.get(rc) or RAILWAYS.name(code, rc) or rc
+                tm = (it.get("odpt:timeOfOrigin") or it.get("dc:date") or "")[11:16]
+                out.append(status_record(op_name, rail_ja, txt, tm, logos.get(rc),
+                                         display=f"{op_name}・{rail_ja}➡{txt}"))
         except Exception as e:
-            print(f"ODPT fetch error ({op_name}):", e)
+            LOG.warn(f"ODPT fetch error ({op_name}): {e}", key=f"odpt:{op_name}")
+
+    METRICS.observe("fetch_seconds", time.perf_counter() - t0, source="odpt")
+    return out if fetched else None
+
+
+_status_last: dict[str, list[dict[str, str | None]]] = {}   # 取得元 ➜ 最後に取得できた異常情報
+
+
+def get_status() -> list[dict[str, str | None]]:
+    """
+    東急 + ODPT の異常情報をまとめる (異常がなければ空リスト)。
+    取得できなかった取得元は前回の結果を使う。どちらも取得できなければ例外にして、
+    BackgroundRefresher に前回のスナップショット (古いが本物の情報) を残させる
+    """
+    fetched = {"tokyu": fetch_tokyu(), "odpt": fetch_odpt()}
+    if all(items is None for items in fetched.values()):
+        raise RuntimeError("no status source reachable")
+    for source, items in fetched.items():
+        if items is not None:
+            _status_last[source] = items
+    return [it for source in fetched for it in _status_last.get(source, [])]
+
+
+STATUS = BackgroundRefresher("status", get_status, interval=60, empty=None,
+                             valid=lambda d: isinstance(d, list), shared=SHARED)
 
-    return out
+
+def status_items(data: list[dict] | None) -> list[dict[str, str | None]]:
+    """表示する運行情報。未取得 (None) なら取得エラー、異常なし ([]) なら「各社平常運転です」の 1 件"""
+    if data is None:
+        return [status_record("", "", "運行情報取得エラー")]
+    return data or [status_record("", "", "各社平常運転です")]
+
+
+def status_panel(data: list[dict] | None) -> dict:
+    """運行情報パネルが描く項目だけ (表示文と、あればロゴ)"""
+    return {"status": [{"text": it["text"], "logo": it["logo"]} if it.get("logo") else {"text": it["text"]}
+                       for it in status_items(data)]}
 
 
 @app.route("/api/status")
 def api_status():
-    msgs = fetch_tokyu()
-    items: list[dict[str, str]] = [{"logo": None, "text": m} for m in msgs]
-    items.extend(fetch_odpt())
-    if not items:
-        items = [{"logo": None, "text": "各社平常運転です"}]
-    return jsonify({"status": items})
+    # ?full=1 : 事業者・路線・深刻度・時刻・本文を含む status_record をそのまま返す
+    snap = STATUS.get()
+    if request.args.get("full") == "1":
+        return snapshot_json(snap, {"status": status_items(snap.data)})
+    return panel_json("status", snap, status_panel)
+
+# ──────────────────────────────────────────
+#  API: プッシュ配信 (Server-Sent Events)
+# ──────────────────────────────────────────
+class EventHub:
+    """
+    1 本のスレッドが毎秒、発車案内 (分が変わった時) と各スナップショット (更新された時) を確認し、
+    変化した分だけをイベントとして発行する。各クライアントの接続はそのバイト列を流すだけ。
+      schedule : 内容が変わった路線 1 本ごとに {"current_time", "routes": [路線]}
+      status / news / weather : 各 API (既定の絞った形) と同じ JSON
+    発車案内は全路線を 1 回だけ計算し、接続ごとに表示対象 (scope) の路線・方面だけを流す。
+    max_streams : WSGI (gthread) で同時に開いておく接続の上限。接続 1 本がスレッドを 1 本占有するので、
+    超えた分は断って (503) 画面側をポーリングに切り替えさせ、通常の /api/* に回すスレッドを残す。
+    None は無制限 (開発サーバー・asgi.py はこの上限を使わない)
+    """
+
+    FEEDS = (
+        ("status",  lambda: STATUS,  status_panel),
+        ("news",    lambda: NEWS,    news_payload),
+        ("weather", lambda: WEATHER, weather_panel),
+    )
+
+    def __init__(self, tick: float = 1.0, keepalive: float = 15.0, max_streams: int | None = None) -> None:
+        self.tick = tick
+        self.keepalive = keepalive
+        self.max_streams = max_streams
+        self.streams = 0   # 開いている WSGI の接続数
+        self._cond = threading.Condition()
+        self._seq = 0
+        # (seq, ROUTES の添字 (発車案内以外は None), 配信内容, 整形済みバイト列)
+        self._events: deque[tuple[int, int | None, object, bytes]] = deque(maxlen=256)
+        self._latest: dict[tuple[str, int | None], tuple[object, bytes]] = {}   # 最新の全量 (接続直後に送る)
+        self._routes: dict[int, dict] = {}           # ROUTES の添字 ➜ 直近に配信した内容
+        self._bucket: tuple | None = None
+        self._updated: dict[str, float | None] = {}
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-hub", daemon=True)
+                self._thread.start()
+
+    def _format(self, seq: int, name: str, data: object) -> bytes:
+        return f"id: {seq}\nevent: {name}\ndata: {app.json.dumps(data)}\n\n".encode("utf-8")
+
+    def _publish(self, name: str, data: object, route: int | None = None) -> None:
+        with self._cond:
+            self._seq += 1
+            msg = self._format(self._seq, name, data)
+            self._events.append((self._seq, route, data, msg))
+            self._latest[(name, route)] = (data, msg)
+            self._cond.notify_all()
+
+    def _scoped(self, route: int | None, data: object, msg: bytes, scope: dict[int, tuple] | None,
+                seq: int) -> bytes | None:
+        """scope に合わせてイベントを絞る (対象外なら None、方面の一部だけなら作り直す)"""
+        if route is None or scope is None:
+            return msg
+        dis = scope.get(route)
+        if dis is None:
+            return None
+        dirs = ROUTES[route].get("directions", [])
+        if len(dis) == len(dirs):
+            return msg
+        ent = data["routes"][0]
+        cols = {dirs[i]["column"] for i in dis}
+        ent = {**ent, "schedules": {k: v for k, v in ent["schedules"].items() if k in cols}}
+        return self._format(seq, "schedule", {**data, "routes": [ent]})
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                LOG.warn(f"event hub error: {e}", key="event-hub")
+            time.sleep(self.tick)
+
+    def poll(self) -> None:
+        now = datetime.now()
+        bucket = (CALENDAR.service_date(now), -(-service_seconds(now) // 60))
+        if bucket != self._bucket:
+            self._bucket = bucket
+            sched = build_schedule(now)
+            for ri, ent in enumerate(sched["routes"]):
+                if self._routes.get(ri) != ent:
+                    self._routes[ri] = ent
+                    self._publish("schedule", {"current_time": sched["current_time"], "routes": [ent]}, ri)
+
+        for name, ref, wrap in self.FEEDS:
+            snap = ref().get()
+            if snap.updated != self._updated.get(name, -1):
+                self._updated[name] = snap.updated
+                self._publish(name, snapshot_payload(snap, wrap(snap.data)))
+
+    def stream(self, scope: Scope | None = None) -> Iterator[bytes]:
+        """
+        接続直後に全量、以降は差分イベントを流す (無通信が続けばコメント行で keep-alive)。
+        scope を渡すと発車案内はその路線・方面だけになる。
+        """
+        seq, sel, first = self.open(scope)
+        yield b"".join(first)
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._seq > seq, timeout=self.keepalive)
+            seq, new = self.since(seq, sel)
+            yield b"".join(new) if new else b": keep-alive\n\n"
+
+    def acquire(self) -> bool:
+        """WSGI の接続を 1 本数える。上限に達していれば False (数えない)"""
+        with self._cond:
+            if self.max_streams is not None and self.streams >= self.max_streams:
+                return False
+            self.streams += 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self.streams -= 1
+
+    def open(self, scope: Scope | None = None) -> tuple[int, dict[int, tuple] | None, list[bytes]]:
+        """接続開始: (現在の seq, 絞り込み条件, 最初に送るバイト列) を返す"""
+        self.start()
+        sel = dict(scope) if scope is not None else None
+        with self._cond:
+            seq = self._seq
+            initial = [(route, data, msg) for (_, route), (data, msg) in self._latest.items()]
+        first = [b"retry: 3000\n\n"]
+        first += [out for route, data, msg in initial
+                  if (out := self._scoped(route, data, msg, sel, seq)) is not None]
+        return seq, sel, first
+
+    def since(self, seq: int, sel: dict[int, tuple] | None) -> tuple[int, list[bytes]]:
+        """seq より後のイベントを絞り込んで返す (待たない。asgi.py の非同期ストリームからも使う)"""
+        with self._cond:
+            new = [(i, route, data, msg) for i, route, data, msg in self._events if i > seq]
+            seq = self._seq
+        return seq, [out for i, route, data, msg in new
+                     if (out := self._scoped(route, data, msg, sel, i)) is not None]
+
+
+# WSGI で同時に開いておく SSE 接続の上限 (ワーカーごと)。gunicorn.conf.py が threads の半分に設定する。0 は無制限
+MAX_STREAMS = int(os.environ.get("TIMETABLE_MAX_STREAMS", "0"))
+STREAM_RETRY_AFTER = 300   # 断った接続に再接続を勧めるまでの秒 (画面はその間ポーリングする)
+EVENTS = EventHub(max_streams=MAX_STREAMS or None)
+
+
+@app.route("/api/stream")
+def api_stream():
+    # schedule=0 : 発車案内を端末側で数えるクライアント (/api/schedule/day) には schedule イベントを送らない
+    try:
+        scope = () if request.args.get("schedule") == "0" else scope_from_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not EVENTS.acquire():
+        # EventSource は 503 で再接続をやめ onerror になる ➜ app.js がポーリングに切り替える
+        METRICS.inc("stream_rejected_total")
+        resp = Response(f"retry: {STREAM_RETRY_AFTER * 1000}\n\n", status=503, mimetype="text/event-stream")
+        resp.headers["Retry-After"] = str(STREAM_RETRY_AFTER)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
+    resp = Response(EVENTS.stream(scope), mimetype="text/event-stream")
+    resp.call_on_close(EVENTS.release)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"   # リバースプロキシでのバッファリングを止める
+    return resp
+
+
+# ──────────────────────────────────────────
+#  計測 (/metrics) とリクエスト単位のプロファイル
+# ──────────────────────────────────────────
+# X-Profile ヘッダを受け付けるか (debug 起動時は常に有効)
+PROFILE_ENABLED = os.environ.get("TIMETABLE_PROFILE") == "1"
+
+METRICS.describe("store_lookups_total", "時刻表ストアの参照 (memory / snapshot / parsed / missing)")
+METRICS.describe("store_load_seconds", "時刻表ファイル 1 本のパース時間")
+METRICS.describe("response_cache_total", "応答キャッシュのヒット / ミス")
+METRICS.describe("schedule_build_seconds", "発車案内 JSON の組み立て時間")
+METRICS.describe("upstream_requests_total", "上流 API へのリクエスト結果")
+METRICS.describe("upstream_request_seconds", "上流 API の応答時間")
+METRICS.describe("refresh_seconds", "バックグラウンド更新 1 回の所要時間")
+METRICS.describe("parse_seconds", "上流応答のパース時間")
+METRICS.describe("request_seconds", "エンドポイントごとの処理時間")
+METRICS.describe("news_feed_total", "ニュースフィードの取り込み (parsed / unchanged)")
+METRICS.describe("news_items_total", "新しく取り込んだ見出しの数")
+METRICS.describe("tokyu_parse_total", "東急運行情報ページの解析 (parsed / unchanged)")
+METRICS.describe("railway_cache_total", "ODPT 路線メタデータのキャッシュ (hit / negative / miss)")
+METRICS.describe("logo_downloads_total", "保存したロゴ画像の数")
+METRICS.describe("plan_index_seconds", "経路検索の索引 (接続の配列) を作る時間")
+METRICS.describe("plan_seconds", "経路検索 1 回の走査時間")
+METRICS.describe("stream_rejected_total", "上限 (TIMETABLE_MAX_STREAMS) を超えて断った SSE 接続")
+METRICS.describe("timetable_reload_total", "監視による時刻表の読み直し (ok / removed / invalid / unchanged / pending)")
+METRICS.gauge("refresh_age_seconds", lambda: {
+    (("feed", r.name),): r.peek().age for r in (WEATHER, NEWS, STATUS) if r.peek().age is not None
+}, "最後に取得成功してからの秒数")
+METRICS.gauge("upstream_circuit_open", lambda: {
+    (("host", host),): float(state != "closed") for host, state in HTTP.stats().items()
+}, "サーキットが開いていれば 1")
+METRICS.gauge("store_parsed", lambda: {(): TIMETABLES.parsed}, "起動後にファイルからパースした時刻表の数")
+METRICS.gauge("sse_streams", lambda: {(): EVENTS.streams}, "開いている SSE 接続 (WSGI)")
+
+
+@app.before_request
+def _request_begin():
+    g.t0 = time.perf_counter()
+    mode = request.headers.get("X-Profile")
+    if mode and (PROFILE_ENABLED or app.debug):
+        prof = cProfile.Profile() if mode == "cprofile" else None
+        g.profile = (start_trace(), prof)
+        if prof is not None:
+            prof.enable()
+
+
+@app.after_request
+def _request_end(resp: Response) -> Response:
+    elapsed = time.perf_counter() - g.t0
+    METRICS.observe("request_seconds", elapsed, endpoint=request.endpoint or "-")
+    profile = g.pop("profile", None)
+    if profile is None:
+        return resp
+    token, prof = profile
+    timing = server_timing(end_trace(token), elapsed)
+    if prof is not None:
+        # X-Profile: cprofile ➜ 本文の代わりに累積時間順の関数プロファイルを返す
+        prof.disable()
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(40)
+        resp = Response(buf.getvalue(), mimetype="text/plain")
+    resp.headers["Server-Timing"] = timing
+    return resp
+
+
+@app.teardown_request
+def _request_teardown(exc: BaseException | None) -> None:
+    profile = g.pop("profile", None)   # after_request まで届かなかった時 (例外) の後始末
+    if profile is not None:
+        end_trace(profile[0])
+        if profile[1] is not None:
+            profile[1].disable()
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ──────────────────────────────────────────
+#  静的ファイル (assets.py で作ったハッシュ入りの名前・圧縮済みの版を配信)
+# ──────────────────────────────────────────
+ASSET_DIR = STATIC_DIR / "dist"        # assets.build の出力 (自動生成)
+ASSET_MAX_AGE = 365 * 86400            # ファイル名が内容のハッシュなので長期キャッシュしてよい
+ASSET_SUFFIX = {"br": ".br", "gzip": ".gz"}
+
+
+class StaticAssets:
+    """
+    static/ を assets.build で static/dist/ に書き出し、その manifest で
+      ・テンプレートに出す URL (url / images) を引き
+      ・Accept-Encoding に合う圧縮済みファイル (encoding) を選ぶ
+    manifest が無い名前・デバッグ起動中は従来どおり /static/<name> を返す (編集がすぐ反映されるように)。
+    """
+
+    def __init__(self, static_dir: Path, out_dir: Path) -> None:
+        self.static_dir = static_dir
+        self.out_dir = out_dir
+        self.files: dict[str, str] = {}
+        self.encodings: dict[str, list[str]] = {}
+
+    def build(self) -> None:
+        try:
+            manifest = build_assets(self.static_dir, self.out_dir)
+        except OSError as e:
+            LOG.warn(f"static asset build error: {e}")
+            return
+        self.files, self.encodings = manifest["files"], manifest["encodings"]
+        LOG.info(f"static assets built: {len(self.files)} files ➜ {self.out_dir}")
+
+    def url(self, name: str) -> str:
+        hashed = None if app.debug else self.files.get(name)
+        return f"/static/dist/{hashed}" if hashed else f"/static/{name}"
+
+    def images(self) -> dict[str, str]:
+        """img/ の画像ファイル名 ➜ URL (app.js が路線ロゴを引く)"""
+        return {name[4:]: self.url(name) for name in self.files if name.startswith("img/")}
+
+    def encoding(self, hashed: str, accept) -> str | None:
+        """圧縮版のうちクライアントが受け付けるもの (br ➜ gzip の順)。無ければ None"""
+        return next((e for e in self.encodings.get(hashed, ()) if accept[e]), None)
+
+
+ASSETS = StaticAssets(STATIC_DIR, ASSET_DIR)
+
+
+@app.route("/static/dist/<path:name>")
+def asset_file(name: str):
+    enc = ASSETS.encoding(name, request.accept_encodings)
+    mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    resp = send_from_directory(ASSET_DIR, name + ASSET_SUFFIX[enc] if enc else name,
+                               mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    if enc:
+        resp.headers["Content-Encoding"] = enc
+    resp.headers["Cache-Control"] += ", immutable"
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+
+@app.context_processor
+def _asset_urls():
+    return {"asset_url": ASSETS.url, "asset_images": ASSETS.images()}
+
 
 # ──────────────────────────────────────────
 #  ルート
@@ -630,41 +2750,34 @@ def index_page(p: int):
     return render_template("index.html", page=p)
 
 
+@app.route("/api/sites")
+def api_sites():
+    return jsonify({"sites": [{"name": st.name, "label": st.label, "boards": list(st.boards),
+                               "routes": [r["id"] for r in ROUTES if r.get("site", DEFAULT_SITE) == st.name]}
+                              for st in SITES.values()]})
+
+
+@app.route("/site/<name>/")
+@app.route("/site/<name>/page/<int:p>")
+def site_page(name: str, p: int = 1):
+    # サイトごとの案内板 (画面は API に site=<name> を付けて問い合わせる)
+    if name not in SITES:
+        return jsonify({"error": f"unknown site: {name}"}), 404
+    return render_template("index.html", page=p, site=name)
+
+
 # ──────────────────────────────────────────
-def ensure_csv_encoding():
-    """CSVファイルのエンコーディングを確認・修正"""
-    # ブルーラインCSV
-    bl_files = [
-        f"timetable_BL_{day}_{dest}.csv" 
-        for day in ["weekday", "holiday"] 
-        for dest in ["Azamino", "Shonandai"]
-    ]
-    
-    # 東急バスCSV
-    bus_files = [
-        f"timetable_BUS_{day}_{dest}.csv"
-        for day in ["weekday", "holiday", "saturday"]
-        for dest in ["Saginuma", "CenterKita"]
-    ]
-    
-    # 全てのCSVをチェック
-    for file_list, file_type in [(bl_files, "ブルーライン"), (bus_files, "東急バス")]:
-        for filename in file_list:
-            csv_path = DATA_DIR / filename
-            if not csv_path.exists():
-                print(f"[WARNING] {file_type}時刻表ファイルが見つかりません: {filename}")
-                continue
-                
-            try:
-                # ファイルをcp932で読み込んでエンコーディングを確認
-                with open(csv_path, 'r', encoding='cp932') as f:
-                    content = f.read()
-                print(f"[INFO] {file_type}時刻表確認: {filename} (OK)")
-            except Exception as e:
-                print(f"[ERROR] {file_type}時刻表エンコーディングチェック失敗: {filename} - {e}")
+def prepare() -> None:
+    """起動時の準備 (開発サーバー・gunicorn・asgi.py 共通)"""
+    ASSETS.build()
+    preload_timetables()
+    for site in SITES:
+        connection_index(CALENDAR.day_type(), site)   # 経路検索の索引も先に作っておく
+
 
 # アプリケーション起動前に実行
 if __name__ == "__main__":
-    # 既存のコードをrename
-    ensure_csv_encoding()
+    # 開発用 (Werkzeug のデバッグサーバー)。本番は gunicorn.conf.py / asgi.py を使う
+    prepare()
+    WATCHER.start()
     app.run(debug=True, host="0.0.0.0", port=5000)
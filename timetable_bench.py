@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク / 負荷試験 (オフライン用)
+──────────────────────────────────────────
+時計を固定し、合成した時刻表 (1 方面あたり 100〜50,000 本、路線数も指定可) で次を計測する。
+  loaders : fetch_train_schedule / fetch_bus_schedule_csv / fetch_bus_schedule の読み込み
+  select  : build_schedule (api_schedule の発車選択ループ、キャッシュなし)
+  request : Flask テストクライアント経由の /api/schedule (キャッシュなし / あり / 304)
+  load    : 実サーバーへ複数クライアントから同時アクセス (上流 API はローカルのスタブサーバー)
+結果は p50 / p99 レイテンシ・スループット・ピークメモリで表示する。
+時刻表データ・上流 API とも本物には触らない (合成データは一時ディレクトリに作って消す)。
+
+使い方:
+    python timetable_bench.py                           # 全シナリオ
+    python timetable_bench.py loaders select --rows 100 5000
+    python timetable_bench.py load --clients 32 --duration 10 --upstream-delay 0.2
+    python timetable_bench.py load --url http://127.0.0.1:5000   # 起動済みのサーバー (gunicorn / uvicorn) を叩く
+──────────────────────────────────────────
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple
+import argparse
+import csv
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import requests
+from werkzeug.serving import make_server
+
+import timetable_app as ta
+
+try:
+    import resource   # Unix のみ (Windows ではピーク RSS を表示しない)
+except ImportError:
+    resource = None
+
+FROZEN = datetime(2026, 10, 16, 8, 15, 30)   # 金曜 (平日ダイヤ) の朝
+SCENARIOS = ("loaders", "select", "request", "load")
+
+
+class _FrozenDateTime(datetime):
+    """datetime.now() だけを FROZEN に固定する"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return FROZEN if tz is None else FROZEN.replace(tzinfo=tz)
+
+
+class Result(NamedTuple):
+    name: str
+    runs: int
+    p50_ms: float
+    p99_ms: float
+    per_sec: float
+    peak_kb: float | None   # tracemalloc のピーク (load では None)
+
+
+# ──────────────────────────────────────────
+#  計測
+# ──────────────────────────────────────────
+def percentile(sorted_ns: list[int], q: float) -> float:
+    """ソート済みのナノ秒リスト ➜ q 分位 (ミリ秒)"""
+    if not sorted_ns:
+        return float("nan")
+    i = min(len(sorted_ns) - 1, int(q * len(sorted_ns)))
+    return sorted_ns[i] / 1e6
+
+
+def measure(name: str, fn: Callable[[], object], min_time: float = 1.0, min_runs: int = 5) -> Result:
+    """fn を min_time 秒 (かつ min_runs 回以上) 繰り返して分位点を取り、別に 1 回だけピークメモリを測る"""
+    fn()   # 初回 (import・ファイルキャッシュ) は捨てる
+    lat: list[int] = []
+    start = time.perf_counter()
+    while len(lat) < min_runs or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter_ns()
+        fn()
+        lat.append(time.perf_counter_ns() - t0)
+    total = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    lat.sort()
+    return Result(name, len(lat), percentile(lat, 0.50), percentile(lat, 0.99), len(lat) / total, peak / 1024)
+
+
+def report(title: str, results: list[Result]) -> None:
+    print(f"\n■ {title}")
+    print(f"  {'case':<44} {'runs':>7} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>10} {'peak KB':>10}")
+    for r in results:
+        peak = f"{r.peak_kb:10.0f}" if r.peak_kb is not None else f"{'-':>10}"
+        print(f"  {r.name:<44} {r.runs:7d} {r.p50_ms:9.3f} {r.p99_ms:9.3f} {r.per_sec:10.1f} {peak}")
+
+
+@contextmanager
+def quiet() -> Iterator[None]:
+    """ローダーの [DEBUG] 出力を計測中だけ捨てる"""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, redirect_stdout(devnull):
+        yield
+
+
+# ──────────────────────────────────────────
+#  合成時刻表
+# ──────────────────────────────────────────
+def synth_minutes(n: int) -> list[tuple[int, int]]:
+    """5:00〜翌 1:00 に n 本を均等に並べた (時, 分)。本数が多ければ同じ分に複数本"""
+    span = 20 * 60
+    return [divmod((5 * 60 + i * span // n) % (24 * 60), 60) for i in range(n)]
+
+
+def write_train_csv(path: Path, n: int) -> None:
+    types, dests = ("各停", "急行", "快速"), ("大井町", "溝の口", "二子玉川")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["時刻", "種別", "行先", "備考"])
+        w.writerows([f"{h:02d}:{m:02d}", types[i % 3], dests[i % 3], ""]
+                    for i, (h, m) in enumerate(synth_minutes(n)))
+
+
+def write_bus_csv(path: Path, n: int) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["時刻", "行先", "備考"])
+        w.writerows([f"{h:02d}:{m:02d}", "鷺沼駅", ""] for h, m in synth_minutes(n))
+
+
+def write_bus_xlsx(path: Path, n: int, keys: list[str]) -> None:
+    """1 列目が時、2 列目以降が方面ごとの分 (空白区切り) のシートを 平日_/土休日_ で作る"""
+    from openpyxl import Workbook
+
+    by_hour: dict[int, list[str]] = {}
+    for h, m in synth_minutes(n):
+        by_hour.setdefault(h, []).append(f"{m:02d}")
+    wb = Workbook(write_only=True)
+    for day in ("平日", "土休日"):
+        for key in keys:
+            ws = wb.create_sheet(f"{day}_{key}")
+            ws.append(["時", "分"])
+            for h in sorted(by_hour, key=lambda h: ta.to_service_minutes(h, 0)):
+                ws.append([h, " ".join(by_hour[h])])
+    wb.save(path)
+
+
+def synth_routes(data_dir: Path, rows: int, n_routes: int) -> list[dict]:
+    """
+    n_routes 本の路線 (電車 CSV : バス CSV : バス Excel ≒ 2 : 1 : 1, 各 2 方面) を作り、
+    平日ダイヤ分のファイルを data_dir に書き出す
+    """
+    routes = []
+    for i in range(n_routes):
+        kind = ("train", "train", "bus_csv", "bus")[i % 4]
+        rid = f"S{i}"
+        r = dict(id=rid, label=f"合成路線 {i}", type=kind, max=3, walk=10, run=5, directions=[])
+        for j, tag in enumerate(("Up", "Down")):
+            col = f"方面{j}"
+            if kind == "train":
+                r["line_code"] = rid
+                r["directions"].append(dict(column=col, dest_tag=tag))
+                write_train_csv(ta.train_csv_path(rid, tag, "weekday"), rows)
+            elif kind == "bus_csv":
+                r["directions"].append(dict(column=col, dest_tag=f"{rid}{tag}"))
+                write_bus_csv(ta.bus_csv_path(f"{rid}{tag}", "weekday"), rows)
+            else:
+                r["file"] = data_dir / f"bus_{rid}.xlsx"
+                r["directions"].append(dict(column="分", sheet_direction=f"{rid}{tag}"))
+        if kind == "bus":
+            write_bus_xlsx(r["file"], rows, [d["sheet_direction"] for d in r["directions"]])
+        routes.append(r)
+    return routes
+
+
+def reset_caches() -> None:
+    """時刻表から作ったキャッシュ (応答・連結済みの発車表・経路検索の索引) を捨てる"""
+    ta.SCHEDULE_CACHE.clear()
+    ta.DAY_SCHEDULE_CACHE.clear()
+    ta.clear_batches()
+
+
+@contextmanager
+def synthetic_tree(rows: int, n_routes: int) -> Iterator[list[dict]]:
+    """合成時刻表をアプリに差し込み、終わったら元の ROUTES / データディレクトリに戻す"""
+    saved = (ta.DATA_DIR, list(ta.ROUTES), dict(ta.TIMETABLE_SOURCES), ta.TIMETABLES)
+    with tempfile.TemporaryDirectory(prefix="ttbench-") as tmp:
+        ta.DATA_DIR = Path(tmp)
+        try:
+            routes = synth_routes(ta.DATA_DIR, rows, n_routes)
+            ta.ROUTES[:] = routes
+            ta.TIMETABLE_SOURCES.clear()
+            ta.TIMETABLE_SOURCES.update(ta.timetable_sources(routes))
+            ta.TIMETABLES = ta.TimetableStore()   # スナップショットは使わない
+            reset_caches()
+            yield routes
+        finally:
+            ta.DATA_DIR, ta.ROUTES[:], ta.TIMETABLES = saved[0], saved[1], saved[3]
+            ta.TIMETABLE_SOURCES.clear()
+            ta.TIMETABLE_SOURCES.update(saved[2])
+            reset_caches()
+
+
+# ──────────────────────────────────────────
+#  シナリオ
+# ──────────────────────────────────────────
+def bench_loaders(sizes: list[int], min_time: float) -> list[Result]:
+    out = []
+    for rows in sizes:
+        with synthetic_tree(rows, 4) as routes, quiet():
+            train, bus_csv, bus_xlsx = routes[0], routes[2], routes[3]
+            d = bus_xlsx["directions"][0]
+            sheet = ta.sheet_name(bus_xlsx["type"], d["sheet_direction"], "weekday")
+            out.append(measure(f"fetch_train_schedule   rows={rows}",
+                               lambda: ta.fetch_train_schedule(train["line_code"], "Up"), min_time))
+            out.append(measure(f"fetch_bus_schedule_csv rows={rows}",
+                               lambda: ta.fetch_bus_schedule_csv("bus_csv", bus_csv["directions"][0]["dest_tag"]),
+                               min_time))
+            out.append(measure(f"fetch_bus_schedule     rows={rows}",
+                               lambda: ta.fetch_bus_schedule(sheet, d["column"], bus_xlsx["file"]), min_time))
+    return out
+
+
+def bench_select(sizes: list[int], n_routes: int, min_time: float) -> list[Result]:
+    out = []
+    for rows in sizes:
+        with synthetic_tree(rows, n_routes), quiet():
+            out.append(measure(f"build_schedule routes={n_routes} rows={rows}",
+                               lambda: ta.build_schedule(FROZEN), min_time))
+    return out
+
+
+def bench_request(sizes: list[int], n_routes: int, min_time: float) -> list[Result]:
+    out = []
+    client = ta.app.test_client()
+    for rows in sizes:
+        with synthetic_tree(rows, n_routes), quiet():
+            def cold():
+                ta.SCHEDULE_CACHE.clear()
+                return client.get("/api/schedule").status_code
+
+            etag = client.get("/api/schedule").headers.get("ETag", "")
+            out.append(measure(f"GET /api/schedule (miss)  rows={rows}", cold, min_time))
+            out.append(measure(f"GET /api/schedule (hit)   rows={rows}",
+                               lambda: client.get("/api/schedule").status_code, min_time))
+            out.append(measure(f"GET /api/schedule (304)   rows={rows}",
+                               lambda: client.get("/api/schedule", headers={"If-None-Match": etag}).status_code,
+                               min_time))
+    return out
+
+
+# ─── 上流 API のスタブ
+_STUB_WEATHER = {"forecasts": [{"dateLabel": label, "telop": "晴れ", "image": {"url": ""},
+                                "chanceOfRain": {"T12_18": "10%"}, "detail": {"wind": "北の風"}}
+                               for label in ("今日", "明日", "明後日")]}
+_STUB_RSS = ("<?xml version='1.0' encoding='UTF-8'?><rss version='2.0'><channel><title>stub</title>"
+             + "".join(f"<item><title>ニュース {i}</title><link>http://stub/{i}</link></item>" for i in range(20))
+             + "</channel></rss>")
+_STUB_TOKYU = ("<html><body><div class='service-info'><ul>"
+               "<li>東横線 平常運転</li><li><time>8:00</time>目黒線 遅延</li></ul></div></body></html>")
+
+
+def start_upstream_stub(delay: float) -> ThreadingHTTPServer:
+    """天気 / RSS / 東急 / ODPT の代わりに固定の応答を返すローカルサーバー (delay 秒待ってから応答)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            if self.path.startswith("/weather"):
+                body, ctype = json.dumps(_STUB_WEATHER).encode(), "application/json"
+            elif self.path.startswith("/rss"):
+                body, ctype = _STUB_RSS.encode(), "application/rss+xml"
+            elif self.path.startswith("/tokyu"):
+                body, ctype = _STUB_TOKYU.encode(), "text/html; charset=utf-8"
+            else:   # ODPT (TrainInformation / Railway) は空配列
+                body, ctype = b"[]", "application/json"
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_port}"
+    ta.W_URL, ta.TOKYU_URL, ta.ODPT_BASE = f"{base}/weather", f"{base}/tokyu", f"{base}/odpt"
+    ta.NHK, ta.GGL = f"{base}/rss/nhk", f"{base}/rss/google"
+    ta.NEWS_FEEDS = (("nhk", ta.NHK), ("google", ta.GGL))
+    cache = Path(tempfile.mkdtemp(prefix="ttbench-odpt-"))   # 本物の路線キャッシュ・ロゴを汚さない
+    ta.RAILWAYS = ta.RailwayCache(cache / "odpt_railways.json", cache / "logos")
+    return srv
+
+
+LOAD_PATHS = ("/api/schedule", "/api/schedule?routes=S0,S1", "/api/status", "/api/weather", "/api/news")
+# --url で外部サーバーを叩く時 (本物の ROUTES)
+URL_PATHS = ("/api/schedule", "/api/schedule?board=train", "/api/status", "/api/weather", "/api/news")
+
+
+def bench_load(rows: int, n_routes: int, clients: int, duration: float, delay: float) -> list[Result]:
+    """アプリをこのプロセス内で起動し、上流をスタブにして drive_load する"""
+    stub = start_upstream_stub(delay)
+    with synthetic_tree(rows, n_routes), quiet():
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)   # アクセスログを止める
+        srv = make_server("127.0.0.1", 0, ta.app, threaded=True)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        out = drive_load(f"http://127.0.0.1:{srv.server_port}", LOAD_PATHS, clients, duration)
+        srv.shutdown()
+    stub.shutdown()
+    return out
+
+
+def drive_load(base: str, paths: tuple[str, ...], clients: int, duration: float) -> list[Result]:
+    """
+    clients 本のスレッドが keep-alive 接続で paths を順に叩き続ける。
+    ブラウザと同じく 2 回目以降は If-None-Match を付ける
+    """
+    lat: dict[str, list[int]] = {p: [] for p in paths}
+    errors = [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def client(k: int) -> None:
+        s, etags, mine = requests.Session(), {}, {p: [] for p in paths}
+        i = k
+        while time.perf_counter() < stop:
+            p = paths[i % len(paths)]
+            i += 1
+            hdr = {"If-None-Match": etags[p]} if p in etags else {}
+            t0 = time.perf_counter_ns()
+            try:
+                r = s.get(base + p, headers=hdr, timeout=30)
+                if r.headers.get("ETag"):
+                    etags[p] = r.headers["ETag"]
+                ok = r.status_code in (200, 304)
+            except requests.RequestException:
+                ok = False
+            mine[p].append(time.perf_counter_ns() - t0)
+            if not ok:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            for p, v in mine.items():
+                lat[p].extend(v)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    out = []
+    for p, v in lat.items():
+        v.sort()
+        out.append(Result(f"{p}", len(v), percentile(v, 0.50), percentile(v, 0.99), len(v) / elapsed, None))
+    allv = sorted(x for v in lat.values() for x in v)
+    out.append(Result(f"total ({clients} clients, errors={errors[0]})", len(allv),
+                      percentile(allv, 0.50), percentile(allv, 0.99), len(allv) / elapsed, None))
+    return out
+
+
+# ──────────────────────────────────────────
+def main() -> None:
+    ap = argparse.ArgumentParser(description="発車案内のベンチマーク / 負荷試験")
+    ap.add_argument("scenarios", nargs="*", help=f"実行するシナリオ {SCENARIOS} (既定: 全部)")
+    ap.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000, 50000],
+                    help="1 方面あたりの本数 (複数指定可)")
+    ap.add_argument("--routes", type=int, default=8, help="合成する路線数")
+    ap.add_argument("--min-time", type=float, default=1.0, help="1 ケースあたりの計測時間 (秒)")
+    ap.add_argument("--clients", type=int, default=16, help="load: 同時クライアント数")
+    ap.add_argument("--duration", type=float, default=5.0, help="load: 計測時間 (秒)")
+    ap.add_argument("--upstream-delay", type=float, default=0.05, help="load: スタブ上流の応答遅延 (秒)")
+    ap.add_argument("--url", help="load: 起動済みサーバーの URL (指定時は合成データ・スタブを使わない)")
+    args = ap.parse_args()
+    todo = args.scenarios or SCENARIOS
+    for name in todo:
+        if name not in SCENARIOS:
+            ap.error(f"未知のシナリオ: {name}")
+
+    ta.datetime = _FrozenDateTime
+    print(f"[INFO] clock frozen at {FROZEN.isoformat()} ({ta.CALENDAR.day_type(FROZEN)})")
+    if "loaders" in todo:
+        report("loaders", bench_loaders(args.rows, args.min_time))
+    if "select" in todo:
+        report("select (build_schedule)", bench_select(args.rows, args.routes, args.min_time))
+    if "request" in todo:
+        report("request (Flask test client)", bench_request(args.rows, args.routes, args.min_time))
+    if "load" in todo and args.url:
+        report(f"load ({args.url}, {args.clients} clients)",
+               drive_load(args.url.rstrip("/"), URL_PATHS, args.clients, args.duration))
+    elif "load" in todo:
+        rows = args.rows[min(1, len(args.rows) - 1)]
+        report(f"load (rows={rows}, routes={args.routes}, upstream delay={args.upstream_delay}s)",
+               bench_load(rows, args.routes, args.clients, args.duration, args.upstream_delay))
+    if resource is not None:
+        print(f"\npeak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+アプリとオフラインのインポータで共有する定義
+──────────────────────────────────────────
+timetable_import.py が Flask アプリ (timetable_app) を読み込まずに済むよう、
+時刻表置き場の場所と営業日の数え方だけをここに置く。
+──────────────────────────────────────────
+"""
+
+from __future__ import annotations
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent    # timetable-app/
+DATA_DIR = BASE_DIR / "timetable_data"        # ★ 時刻表置き場 (CSV/Excel)
+
+SERVICE_DAY_CUTOFF = 3   # 営業日の区切り (時)。これより前の 0:xx〜2:xx 発は前日ダイヤの続きとして扱う
+
+
+def to_service_minutes(h: int, m: int) -> int:
+    """時・分 ➜ 営業日開始 (0:00 基準) からの分。深夜帯は 24:xx, 25:xx として数える"""
+    if h < SERVICE_DAY_CUTOFF:
+        h += 24
+    return h * 60 + m
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+時刻表インポータ (オフライン用)
+──────────────────────────────────────────
+東急電鉄 / 東急バスの時刻表ページを保存した HTML (timetable_data/*.txt) から
+時・分・種別・行き先を全曜日分取り出し、アプリが読む正規化済み CSV
+(timetable_{路線}_{weekday|saturday|holiday}_{方面}.csv, UTF-8, 営業日順ソート済み) を書き出す。
+
+HTML は 1 MB 近いので BeautifulSoup の木は作らず、html.parser にチャンクで流し込みながら
+必要なタグだけを状態機械で拾う。
+
+使い方:
+    python timetable_import.py                 # SOURCES の全ファイルを timetable_data/ に出力
+    python timetable_import.py MG_Hiyoshi.txt  # 指定ファイルのみ
+    python timetable_import.py --out /tmp/tt   # 出力先を変える
+──────────────────────────────────────────
+"""
+
+from __future__ import annotations
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Iterator, NamedTuple
+import argparse
+import codecs
+import csv
+import re
+
+from timetable_common import DATA_DIR, to_service_minutes
+
+# 入力ファイル ➜ (路線コード, 方面タグ)
+SOURCES = {
+    "OM_Ooimachi.txt":            ("OM", "Ooimachi"),
+    "OM_Mizonokuchi.txt":         ("OM", "Mizonokuchi"),
+    "MG_Hiyoshi.txt":             ("MG", "Hiyoshi"),
+    "BUS_chotokuji_center.txt":   ("BUS", "CenterKita"),
+    "BUS_chotokuji_saginuma.txt": ("BUS", "Saginuma"),
+}
+
+# ページ上の曜日表記 ➜ ファイル名用タグ
+_DAY_TAGS = {
+    "weekday": "weekday", "saturday": "saturday", "sunday": "holiday",   # 電車 (diagram-table-xxx)
+    "wkd": "weekday", "std": "saturday", "snd": "holiday",               # バス (td class)
+}
+
+_CHUNK = 64 * 1024
+
+
+class Departure(NamedTuple):
+    day: str     # weekday / saturday / holiday
+    hour: int
+    minute: int
+    type: str    # 種別 (バスは "")
+    dest: str    # 行き先
+    note: str    # 備考 (停車駅の注記, バスは系統名)
+
+
+class _TrainDiagramParser(HTMLParser):
+    """
+    東急電鉄の駅時刻表ページ。
+      <div id="diagram-table-weekday"> … <dt>5</dt><dd><a …>
+        <div class="topLegends" data-text="各停①"> <div class="minute">03</div>
+        <div class="speak-only">3分はつ 各停（…） 大井町いき</div></a> …
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.out: list[Departure] = []
+        self.day = ""
+        self.hour: int | None = None
+        self._cap: str | None = None      # いま文字を拾っている要素 ("dt" / "minute" / "dest" / "speak")
+        self._buf: list[str] = []
+        self._rec: dict | None = None
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if self._cap is not None:
+            self._buf.append("\n")      # 子要素の境目 (<dt> の "5" と "5じだい" など) を区切る
+        a = dict(attrs)
+        cls = a.get("class") or ""
+        if tag == "div" and (a.get("id") or "").startswith("diagram-table-"):
+            self.day = _DAY_TAGS.get(a["id"].rsplit("-", 1)[-1], "")
+        elif tag == "dt":
+            self._start("dt")
+        elif tag == "a" and self.day and self.hour is not None and "Timetable" in (a.get("href") or ""):
+            self._rec = {"type": "", "minute": None, "dest": "", "speak": ""}
+        elif self._rec is not None and tag == "div":
+            if "topLegends" in cls:
+                self._rec["type"] = (a.get("data-text") or "").strip()
+            elif cls == "minute":
+                self._start("minute")
+            elif cls == "destination":
+                self._start("dest")
+            elif cls == "speak-only":
+                self._start("speak")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "dt" and self._cap == "dt":
+            m = re.search(r"\d+", self._stop())
+            self.hour = int(m.group()) if m else None
+        elif tag == "div" and self._cap in ("minute", "dest", "speak") and self._rec is not None:
+            what = self._cap
+            self._rec[what] = self._stop()
+        elif tag == "a" and self._rec is not None:
+            rec, self._rec = self._rec, None
+            if rec["minute"] and rec["minute"].strip().isdigit():
+                # 行き先は表示用の短い表記 (海老名) を優先し、無ければ読み上げ文 (海老名（小田急・相鉄）いき) から取る
+                dest, note = _split_speech(rec["speak"], "いき")
+                dest = rec["dest"].strip() or dest
+                self.out.append(Departure(self.day, self.hour, int(rec["minute"]), rec["type"], dest, note))
+
+    def handle_data(self, data: str) -> None:
+        if self._cap is not None:
+            self._buf.append(data)
+
+    def _start(self, what: str) -> None:
+        self._cap, self._buf = what, []
+
+    def _stop(self) -> str:
+        self._cap = None
+        return "".join(self._buf)
+
+
+class _BusDiagramParser(HTMLParser):
+    """
+    東急バスの停留所時刻表ページ。平日・土曜・休日が横並びの表になっている。
+      <tr><th class="hour">06</th><td class="wkd"> <div class="mm"><a …>
+        <span aria-hidden="true">21</span><span class="speech-only">21分はつ 鷺０３センター北駅行き</span>
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.out: list[Departure] = []
+        self.day = ""
+        self.hour: int | None = None
+        self._cap: str | None = None
+        self._buf: list[str] = []
+        self._minute: str | None = None
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        a = dict(attrs)
+        cls = a.get("class") or ""
+        if tag == "th" and cls == "hour":
+            self._start("hour")
+        elif tag == "td":
+            self.day = _DAY_TAGS.get(cls, "")
+        elif tag == "span" and self.day and self.hour is not None:
+            if a.get("aria-hidden") == "true":
+                self._start("minute")
+            elif cls == "speech-only":
+                self._start("speech")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "th" and self._cap == "hour":
+            txt = self._stop().strip()
+            self.hour = int(txt) if txt.isdigit() else None
+        elif tag == "td":
+            self.day = ""
+        elif tag == "span" and self._cap == "minute":
+            self._minute = self._stop().strip()
+        elif tag == "span" and self._cap == "speech":
+            speech, minute, self._minute = self._stop(), self._minute, None
+            if minute and minute.isdigit():
+                dest, _ = _split_speech(speech, "行き")
+                # "鷺０４すみれが丘経由鷺沼駅" ➜ 行き先 "鷺沼駅", 備考 "鷺０４ すみれが丘経由"
+                m = re.match(r"(\S*?[0-9０-９]+)(.+)", dest)
+                route, dest = (m.group(1), m.group(2)) if m else ("", dest)
+                via, _, dest = dest.rpartition("経由")
+                note = " ".join(x for x in (route, via + "経由" if via else "") if x)
+                self.out.append(Departure(self.day, self.hour, int(minute), "", dest, note))
+
+    def handle_data(self, data: str) -> None:
+        if self._cap is not None:
+            self._buf.append(data)
+
+    def _start(self, what: str) -> None:
+        self._cap, self._buf = what, []
+
+    def _stop(self) -> str:
+        self._cap = None
+        return "".join(self._buf)
+
+
+def _split_speech(text: str, suffix: str) -> tuple[str, str]:
+    """読み上げ用テキスト ➜ (行き先, 注記)。"N分はつ" 行は捨てる"""
+    dest, notes = "", []
+    for ln in (x.strip() for x in text.splitlines()):
+        if not ln or ln.endswith("はつ"):
+            continue
+        if ln.endswith(suffix):
+            dest = ln[: -len(suffix)]
+        else:
+            notes.append(ln)
+    return dest, " ".join(notes)
+
+
+def parse_diagram(path: Path) -> list[Departure]:
+    """HTML ダンプをチャンクごとに流し込んでパースする (ページ全体の木は作らない)"""
+    parser: HTMLParser = _BusDiagramParser() if path.name.startswith("BUS_") else _TrainDiagramParser()
+    dec = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK):
+            parser.feed(dec.decode(chunk))
+    parser.feed(dec.decode(b"", final=True))
+    parser.close()
+    return parser.out
+
+
+def by_day(deps: list[Departure]) -> Iterator[tuple[str, list[Departure]]]:
+    """曜日タグごとに営業日順 (0:xx は 24:xx 扱い) に並べて返す"""
+    for day in ("weekday", "saturday", "holiday"):
+        rows = [d for d in deps if d.day == day]
+        if rows:
+            yield day, sorted(rows, key=lambda d: to_service_minutes(d.hour, d.minute))
+
+
+def write_csv(path: Path, line_code: str, rows: list[Departure]) -> None:
+    """アプリの CSV リーダが読む形式で書き出す (電車: 時刻,種別,行先,備考 / バス: 時刻,行先,備考)"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        if line_code == "BUS":
+            w.writerow(["時刻", "行先", "備考"])
+            w.writerows([f"{d.hour:02d}:{d.minute:02d}", d.dest, d.note] for d in rows)
+        else:
+            w.writerow(["時刻", "種別", "行先", "備考"])
+            w.writerows([f"{d.hour:02d}:{d.minute:02d}", d.type, d.dest, d.note] for d in rows)
+
+
+def import_file(src: Path, out_dir: Path) -> list[Path]:
+    line_code, dest_tag = SOURCES[src.name]
+    written = []
+    for day, rows in by_day(parse_diagram(src)):
+        dst = out_dir / f"timetable_{line_code}_{day}_{dest_tag}.csv"
+        write_csv(dst, line_code, rows)
+        written.append(dst)
+        print(f"[INFO] {src.name} ➜ {dst.name} ({len(rows)} 本)")
+    if not written:
+        print(f"[WARN] 時刻を抽出できませんでした: {src}")
+    return written
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="時刻表 HTML ダンプ ➜ 正規化 CSV")
+    ap.add_argument("files", nargs="*", help=f"入力ファイル名 (既定: {', '.join(SOURCES)})")
+    ap.add_argument("--src", type=Path, default=DATA_DIR, help="入力ディレクトリ")
+    ap.add_argument("--out", type=Path, default=DATA_DIR, help="出力ディレクトリ")
+    args = ap.parse_args()
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    for name in args.files or SOURCES:
+        src = args.src / Path(name).name
+        if src.name not in SOURCES:
+            ap.error(f"未登録の入力ファイル: {src.name} (SOURCES に追加してください)")
+        import_file(src, args.out)
+
+
+if __name__ == "__main__":
+    main()